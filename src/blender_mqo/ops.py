@@ -1,12 +1,14 @@
 import os
 import pathlib
 import math
+import array
 
 import bpy
 from bpy.props import (
     StringProperty,
     BoolProperty,
     EnumProperty,
+    IntProperty,
 )
 from mathutils import Vector
 from bpy_extras.io_utils import ImportHelper, ExportHelper
@@ -15,44 +17,292 @@ from .utils import mqo_file as mqo
 from .utils.bl_class_registry import BlClassRegistry
 from .utils import compatibility as compat
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 MQO_TO_BLENDER_PROJECTION_TYPE = {0: 'BOX', 1: 'FLAT', 2: 'TUBE', 3: 'SPHERE'}
 BLENDER_TO_MQO_PROJECTION_TYPE = {'BOX': 0, 'FLAT': 1, 'TUBE': 2, 'SPHERE': 3}
 MQO_TO_BLENDER_MIRROR_TYPE = {0: 'NONE', 1: 'SEPARATE', 2: 'CONNECT'}
 
 
-def get_outermost_verts(mesh, linked_face_indices, linked_edge_indices):
-    outermost_verts = []
-    for v in mesh.vertices:
-        if len(linked_face_indices[v.index]) != \
-                len(linked_edge_indices[v.index]):
-            outermost_verts.append(v)
-    return outermost_verts
+def reverse_winding(loops):
+    """Reverse the winding order of the loops of a face.
+
+    The first loop is kept at the first as bpy.ops.mesh.flip_normals() does.
+    """
+
+    return loops[:1] + loops[:0:-1]
+
+
+def make_loop_arrays(face_buffer, face_indices):
+    """Make the flat arrays of the faces to construct the mesh.
+
+    Duplicated vertex indices in a face are removed, and the winding order
+    is reversed to match between Blender and Metasequoia. loop_sources
+    holds the index of the loop in face_buffer for each loop of the mesh.
+    """
 
+    buffer_vertex_indices = face_buffer.vertex_indices
+    buffer_loop_starts = face_buffer.loop_starts
+    loop_vertex_indices = array.array('i')
+    loop_sources = array.array('i')
+    loop_starts = array.array('i')
+    loop_totals = array.array('i')
+    for fidx in face_indices:
+        start = buffer_loop_starts[fidx]
+        end = buffer_loop_starts[fidx + 1]
+        face_vidxs = buffer_vertex_indices[start:end]
+        if len(set(face_vidxs)) == len(face_vidxs):
+            sources = list(range(start, end))
+        else:
+            sources = [start + i for i, vidx in enumerate(face_vidxs)
+                       if vidx not in face_vidxs[:i]]
+        sources = reverse_winding(sources)
+        loop_starts.append(len(loop_vertex_indices))
+        loop_totals.append(len(sources))
+        loop_sources.extend(sources)
+        loop_vertex_indices.extend(
+            [buffer_vertex_indices[src] for src in sources])
+
+    return loop_vertex_indices, loop_sources, loop_starts, loop_totals
+
+
+def make_loop_uvs(face_buffer, face_indices, loop_sources, loop_starts):
+    """Make the flat UV coordinates of the mesh loops with V flipped.
+
+    Return None if no face has UV coordinates.
+    """
+
+    uv_coords = face_buffer.uv_coords
+    if uv_coords is None:
+        return None
+    flags = face_buffer.flags
+    has_uv = mqo.FaceBuffer.HAS_UV_COORDS
+    no_uv_faces = [i for i, fidx in enumerate(face_indices)
+                   if not flags[fidx] & has_uv]
+    if len(no_uv_faces) == len(face_indices):
+        return None
+
+    # Metasequoia's V axis is opposite to Blender's.
+    us = uv_coords[0::2]
+    vs = uv_coords[1::2]
+    loop_uvs = array.array('f', bytes(8 * len(loop_sources)))
+    loop_uvs[0::2] = array.array('f', [us[src] for src in loop_sources])
+    loop_uvs[1::2] = array.array('f', [1.0 - vs[src] for src in loop_sources])
+
+    # Faces without UV coordinates are left to (0, 0).
+    for i in no_uv_faces:
+        end = loop_starts[i + 1] if i + 1 < len(loop_starts) \
+            else len(loop_sources)
+        for loop_idx in range(loop_starts[i], end):
+            loop_uvs[loop_idx * 2 + 1] = 0.0
+
+    return loop_uvs
+
+
+def make_face_materials(face_buffer, face_indices):
+    """Return the material index of the faces, or None if the face has no
+    material."""
+
+    flags = face_buffer.flags
+    materials = face_buffer.materials
+    has_material = mqo.FaceBuffer.HAS_MATERIAL
+    return [materials[fidx] if flags[fidx] & has_material else None
+            for fidx in face_indices]
+
+
+def normalize_vectors(vectors):
+    """Normalize the flat 3D vectors and return them as a list of tuples.
+
+    Zero vectors are left as they are.
+    """
+
+    result = []
+    for i in range(0, len(vectors), 3):
+        x, y, z = vectors[i:i + 3]
+        length = math.sqrt(x * x + y * y + z * z)
+        if length != 0.0:
+            x, y, z = x / length, y / length, z / length
+        result.append((x, y, z))
+    return result
+
+
+def make_vertex_normals(face_buffer, face_indices, num_vertices,
+                        num_mesh_vertices):
+    """Average the loop normals of the faces around each vertex.
+
+    The vertices after num_vertices get zero vectors, which
+    means the default normal. Return None if some of the first num_vertices
+    vertices have no normals.
+    """
+
+    flags = face_buffer.flags
+    has_normals = mqo.FaceBuffer.HAS_NORMALS
+    loop_starts = face_buffer.loop_starts
+    loops = array.array('i')
+    for fidx in face_indices:
+        if flags[fidx] & has_normals:
+            loops.extend(range(loop_starts[fidx], loop_starts[fidx + 1]))
+    if not loops:
+        return None
+
+    if numpy is not None:
+        loops = numpy.frombuffer(loops, dtype=numpy.intc)
+        vidxs = numpy.frombuffer(face_buffer.vertex_indices,
+                                 dtype=numpy.intc)[loops]
+        normals = numpy.frombuffer(face_buffer.normals, dtype=numpy.float64)
+        normals = normals.reshape(-1, 3)[loops]
+        if not numpy.bincount(vidxs, minlength=num_vertices).all():
+            return None
+        sums = numpy.zeros((num_mesh_vertices, 3))
+        numpy.add.at(sums, vidxs, normals)
+        lengths = numpy.linalg.norm(sums, axis=1)
+        lengths[lengths == 0.0] = 1.0
+        return sums / lengths[:, numpy.newaxis]
+
+    vertex_indices = face_buffer.vertex_indices
+    normals = face_buffer.normals
+    sums = array.array('d', bytes(24 * num_mesh_vertices))
+    has_vertex_normal = bytearray(num_vertices)
+    for loop in loops:
+        vidx = vertex_indices[loop]
+        has_vertex_normal[vidx] = 1
+        sums[vidx * 3] += normals[loop * 3]
+        sums[vidx * 3 + 1] += normals[loop * 3 + 1]
+        sums[vidx * 3 + 2] += normals[loop * 3 + 2]
+    if not all(has_vertex_normal):
+        return None
+    return normalize_vectors(sums)
+
+
+def make_loop_normals(face_buffer, face_indices, loop_sources, num_loops):
+    """Return the normals of the mesh loops from the per corner normals.
+
+    The loops after loop_sources get zero vectors, which means the default
+    normal. Return None if some faces have no normals.
+    """
+
+    if face_buffer.normals is None or not face_indices:
+        return None
+    flags = face_buffer.flags
+    has_normals = mqo.FaceBuffer.HAS_NORMALS
+    if not all(flags[fidx] & has_normals for fidx in face_indices):
+        return None
+
+    if numpy is not None:
+        normals = numpy.frombuffer(face_buffer.normals, dtype=numpy.float64)
+        loop_normals = numpy.zeros((num_loops, 3))
+        loop_normals[:len(loop_sources)] = normals.reshape(-1, 3)[
+            numpy.frombuffer(loop_sources, dtype=numpy.intc)]
+        lengths = numpy.linalg.norm(loop_normals, axis=1)
+        lengths[lengths == 0.0] = 1.0
+        return loop_normals / lengths[:, numpy.newaxis]
+
+    normals = face_buffer.normals
+    loop_normals = array.array('d', bytes(24 * num_loops))
+    for i, src in enumerate(loop_sources):
+        loop_normals[i * 3] = normals[src * 3]
+        loop_normals[i * 3 + 1] = normals[src * 3 + 1]
+        loop_normals[i * 3 + 2] = normals[src * 3 + 2]
+    return normalize_vectors(loop_normals)
+
+
+def get_boundary_loops(loop_vertex_indices, loop_starts, loop_totals):
+    """Return the boundary loops of the faces as the lists of vertex indices.
+
+    The boundary edges are the edges used by only one face. Each loop
+    follows the winding order of the faces, and ends with its first vertex
+    if the loop is closed.
+    """
+
+    def face_edges():
+        for start, total in zip(loop_starts, loop_totals):
+            for i in range(total):
+                yield (loop_vertex_indices[start + i],
+                       loop_vertex_indices[start + (i + 1) % total])
+
+    edge_face_counts = {}
+    for v0, v1 in face_edges():
+        key = (v0, v1) if v0 < v1 else (v1, v0)
+        edge_face_counts[key] = edge_face_counts.get(key, 0) + 1
+
+    next_verts = {}
+    for v0, v1 in face_edges():
+        key = (v0, v1) if v0 < v1 else (v1, v0)
+        if edge_face_counts[key] == 1:
+            next_verts.setdefault(v0, []).append(v1)
+
+    # Boundary edges are removed from next_verts when visited.
+    boundary_loops = []
+    for first in sorted(next_verts):
+        while next_verts[first]:
+            boundary_loop = [first]
+            cur = first
+            while next_verts.get(cur):
+                cur = next_verts[cur].pop()
+                boundary_loop.append(cur)
+                if cur == first:
+                    break
+            boundary_loops.append(boundary_loop)
 
-def get_linked_face_indices(mesh):
-    linked_face_indices = {v.index: [] for v in mesh.vertices}
-    for face in mesh.polygons:
-        for vidx in face.vertices:
-            linked_face_indices[vidx].append(face.index)
-    return linked_face_indices
+    return boundary_loops
 
 
-def get_linked_edge_indices(mesh):
-    linked_edge_indices = {v.index: [] for v in mesh.vertices}
-    for edge in mesh.edges:
-        for vidx in edge.vertices:
-            linked_edge_indices[vidx].append(edge.index)
-    return linked_edge_indices
+def connect_mirror_boundary(coords, loop_vertex_indices, loop_starts,
+                            loop_totals, mirror_axis):
+    """Add the vertices on the mirror plane and the faces which connect them
+    to the boundary loops. The arrays are extended in place."""
 
+    # TODO: Need to clarify the specification when more than two axes are
+    #       specified. For now, we applied about highest prioritized axis.
+    #       (X > Y > Z)
+    if mirror_axis & 0x1:
+        axis = 0
+    elif mirror_axis & 0x2:
+        axis = 1
+    elif mirror_axis & 0x4:
+        axis = 2
+    else:
+        return
 
-def get_other_vert(mesh, edge, vert):
-    other_vert_idx = None
-    for vidx in edge.vertices:
-        if vidx != vert.index:
-            other_vert_idx = vidx
-            return mesh.vertices[other_vert_idx]
-    return None
+    boundary_loops = get_boundary_loops(loop_vertex_indices, loop_starts,
+                                        loop_totals)
+
+    # make vertices aligned to axis
+    axis_aligned_verts = {}
+    for vidx in sorted({v for lo in boundary_loops for v in lo}):
+        new_vert_co = list(coords[vidx * 3:vidx * 3 + 3])
+        new_vert_co[axis] = 0.0
+        axis_aligned_verts[vidx] = len(coords) // 3
+        coords.extend(new_vert_co)
+
+    # make faces in the opposite direction of the boundary edges to keep
+    # the winding order consistent with the adjacent faces
+    for lo in boundary_loops:
+        for v0, v1 in zip(lo, lo[1:]):
+            loop_starts.append(len(loop_vertex_indices))
+            loop_totals.append(4)
+            loop_vertex_indices.extend([v1, v0, axis_aligned_verts[v0],
+                                        axis_aligned_verts[v1]])
+
+
+def build_mesh(mesh, coords, loop_vertex_indices, loop_starts, loop_totals):
+    """Construct the mesh from the flat arrays of vertex coordinates and
+    loops."""
+
+    mesh.vertices.add(len(coords) // 3)
+    mesh.vertices.foreach_set("co", coords)
+    mesh.loops.add(len(loop_vertex_indices))
+    mesh.loops.foreach_set("vertex_index", loop_vertex_indices)
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    # loop_total is computed from loop_start on Blender 4.0 or later.
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", loop_totals)
+    mesh.update(calc_edges=True)
 
 
 def import_material_v279(mqo_mtrl, filepath):
@@ -168,27 +418,25 @@ def import_object(mqo_obj, materials, vertex_weight_import_options):
         bpy.context.scene.objects.active = new_obj
         new_obj.select = True
 
-    # construct material
-    for mtrl in materials:
-        bpy.ops.object.material_slot_add()
-        if mtrl is not None:
-            new_obj.material_slots[len(new_obj.material_slots) - 1]\
-                .material = mtrl["material"]
-
     # construct mesh
     new_mesh = bpy.context.object.data
-    mqo_verts = mqo_obj.get_vertices()
-    mqo_faces = mqo_obj.get_faces(uniq=True)
-    face_indices = []
-    for f in mqo_faces:
-        vidxs = []
-        for vidx in f.vertex_indices:
-            if vidx not in vidxs:
-                vidxs.append(vidx)
-        face_indices.append(vidxs)
-
-    new_mesh.from_pydata(mqo_verts, [], face_indices)
-    new_mesh.update(calc_edges=True)
+    mqo_face_buffer = mqo_obj.get_face_buffer()
+    mqo_face_indices = mqo_obj.get_face_indices(uniq=True)
+    loop_vertex_indices, loop_sources, loop_starts, loop_totals = \
+        make_loop_arrays(mqo_face_buffer, mqo_face_indices)
+    # foreach_set() writes the buffer at once only if its type matches the
+    # property, which is float32 for the vertex coordinates. The copy is
+    # also extended by the mirror connection.
+    coords = array.array('f', mqo_obj.get_vertex_buffer())
+
+    # make vertices and faces for mirror connection
+    if mqo_obj.mirror is not None:
+        if MQO_TO_BLENDER_MIRROR_TYPE[mqo_obj.mirror] == 'CONNECT':
+            connect_mirror_boundary(coords, loop_vertex_indices, loop_starts,
+                                    loop_totals, mqo_obj.mirror_axis)
+
+    build_mesh(new_mesh, coords, loop_vertex_indices, loop_starts,
+               loop_totals)
 
     vertex_weights = mqo_obj.get_vertexattr('WEIT')
     vertex_weighted_vertices = {}
@@ -196,98 +444,10 @@ def import_object(mqo_obj, materials, vertex_weight_import_options):
         for vidx, weight in vertex_weights.items():
             vertex_weighted_vertices[new_mesh.vertices[vidx]] = weight
 
-    # make vertices and faces for mirror connection
-    # pylint: disable=too-many-nested-blocks
-    if mqo_obj.mirror is not None:
-        if MQO_TO_BLENDER_MIRROR_TYPE[mqo_obj.mirror] == 'CONNECT':
-            linked_face_indices = get_linked_face_indices(new_mesh)
-            linked_edge_indices = get_linked_edge_indices(new_mesh)
-            outermost_verts = get_outermost_verts(
-                new_mesh, linked_face_indices, linked_edge_indices)
-            outermost_vert_indices = [v.index for v in outermost_verts]
-
-            new_verts_co = [list(v.co) for v in new_mesh.vertices]
-            new_faces_indices = [list(f.vertices) for f in new_mesh.polygons]
-
-            # make vertices aligned to axis
-            axis_aligned_verts = {}
-            for i, ovidx in enumerate(outermost_vert_indices):
-                new_vert_co = list(new_mesh.vertices[ovidx].co)
-                axis_index = mqo_obj.mirror_axis
-                # TODO: Need to clarify the specification when more than two
-                #       axes are specified. For now, we applied about highest
-                #       prioritized axis. (X > Y > Z)
-                if axis_index & 0x1:
-                    new_vert_co[0] = 0.0
-                elif axis_index & 0x2:
-                    new_vert_co[1] = 0.0
-                elif axis_index & 0x4:
-                    new_vert_co[2] = 0.0
-                axis_aligned_verts[ovidx] = len(new_verts_co)
-                new_verts_co.append(new_vert_co)
-
-            # make ordered outermost vertices
-            rest = outermost_vert_indices
-            link_groups = []
-            while len(rest) != 0:
-                links = []
-                cur_vert_idx = rest[0]
-                first_vert_idx = rest[0]
-                is_vert_loop = False
-                has_no_link_edge = False
-                is_first_time = True
-                while True:
-                    rest.remove(cur_vert_idx)
-                    # find adjacent vertices
-                    for eidx in linked_edge_indices[cur_vert_idx]:
-                        next_vert = get_other_vert(
-                            new_mesh, new_mesh.edges[eidx],
-                            new_mesh.vertices[cur_vert_idx])
-                        if next_vert.index in rest:
-                            links.append([cur_vert_idx, next_vert.index])
-                            cur_vert_idx = next_vert.index
-                            break
-                    else:  # not found, then check if this is a vertex loop
-                        for eidx in linked_edge_indices[cur_vert_idx]:
-                            next_vert = get_other_vert(
-                                new_mesh, new_mesh.edges[eidx],
-                                new_mesh.vertices[cur_vert_idx])
-                            if next_vert.index == first_vert_idx and \
-                                    not is_first_time:
-                                is_vert_loop = True
-                                links.append([cur_vert_idx, first_vert_idx])
-                                break
-                        else:  # vertex has no linked edge
-                            has_no_link_edge = True
-                    is_first_time = False
-                    if len(rest) == 0 or is_vert_loop or has_no_link_edge:
-                        break
-                link_groups.append(links)
-
-            # make faces
-            for lo in link_groups:
-                for li in lo:
-                    indices = [
-                        li[0], li[1],
-                        axis_aligned_verts[li[1]],
-                        axis_aligned_verts[li[0]],
-                    ]
-                    new_faces_indices.append(indices)
-
-            if compat.check_version(2, 81, 0) < 0:
-                bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.delete(type='VERT')
-                bpy.ops.object.mode_set(mode='OBJECT')
-            else:
-                new_mesh.clear_geometry()
-            new_mesh.from_pydata(new_verts_co, [], new_faces_indices)
-            new_mesh.update(calc_edges=True)
-
     # create UV map
-    has_uvmap = False
-    for face in mqo_faces:
-        if face.uv_coords is not None:
-            has_uvmap = True
+    loop_uvs = make_loop_uvs(mqo_face_buffer, mqo_face_indices, loop_sources,
+                             loop_starts)
+    has_uvmap = loop_uvs is not None
     uv_layer = None
     if has_uvmap:
         if new_mesh.uv_layers.items():
@@ -300,14 +460,11 @@ def import_object(mqo_obj, materials, vertex_weight_import_options):
                 uv_layer = new_mesh.uv_layers.new()
 
     # set UV if exists
-    uv_data_idx = 0
-    for face in mqo_faces:
-        if face.uv_coords is not None:
-            for i in range(face.ngons):
-                uv_layer.data[uv_data_idx].uv = face.uv_coords[i]
-                uv_layer.data[uv_data_idx].uv[1] = \
-                    1 - uv_layer.data[uv_data_idx].uv[1]
-                uv_data_idx += 1
+    if has_uvmap:
+        # The loops added for the mirror connection have no UV coordinates.
+        loop_uvs.frombytes(
+            bytes(8 * (len(new_mesh.loops) - len(loop_sources))))
+        uv_layer.data.foreach_set("uv", loop_uvs)
 
     # Construct vertex groups to store vertex weights.
     if vertex_weighted_vertices:
@@ -330,44 +487,28 @@ def import_object(mqo_obj, materials, vertex_weight_import_options):
                 for v in vs:
                     vertex_weights_group.add([v.index], weight, 'REPLACE')
 
-    mtrl_map = {}
-    for i, face in enumerate(mqo_faces):
-        mtrl_idx = face.material
-        if mtrl_idx is None:
-            continue
-        if mtrl_idx not in mtrl_map:
-            mtrl_map[mtrl_idx] = []
-        mtrl_map[mtrl_idx].append(i)
-
-    # Changing mesh select mode is required to reflect the material
-    # assignments.
-    mesh_select_mode_orig = list(bpy.context.tool_settings.mesh_select_mode)
-    bpy.context.tool_settings.mesh_select_mode = (False, False, True)
-
-    for mtrl_idx, face_indices in mtrl_map.items():
-        # Face selection must be done in object mode requires to switch to
-        # edit mode.
-        for face in new_mesh.polygons:
-            face.select = False
-        for face_idx in face_indices:
-            new_mesh.polygons[face_idx].select = True
-
-        bpy.ops.object.mode_set(mode='EDIT')
-
-        new_obj.active_material_index = mtrl_idx
+    # construct material slots only for the materials used by this object
+    face_materials = make_face_materials(mqo_face_buffer, mqo_face_indices)
+    slot_indices = {}
+    for mtrl_idx in sorted({m for m in face_materials
+                            if m is not None and 0 <= m < len(materials)}):
+        slot_indices[mtrl_idx] = len(new_mesh.materials)
         # if material is not imported, this means to assign None
-        new_obj.active_material = materials[mtrl_idx]["material"]
-        bpy.ops.object.material_slot_assign()
-
-        bpy.ops.object.mode_set(mode='OBJECT')
+        new_mesh.materials.append(materials[mtrl_idx]["material"])
 
-    bpy.context.tool_settings.mesh_select_mode = mesh_select_mode_orig
+    # Assign materials. Faces without material and faces added for the
+    # mirror connection use the first material slot.
+    material_indices = array.array('i', bytes(4 * len(new_mesh.polygons)))
+    for i, mtrl_idx in enumerate(face_materials):
+        if mtrl_idx in slot_indices:
+            material_indices[i] = slot_indices[mtrl_idx]
+    new_mesh.polygons.foreach_set("material_index", material_indices)
 
     # Set texture images.
     if has_uvmap and compat.check_version(2, 80, 0) < 0:
-        for mtrl_idx, face_indices in mtrl_map.items():
-            tex_layer = new_mesh.uv_textures[0]
-            for face_idx in face_indices:
+        tex_layer = new_mesh.uv_textures[0]
+        for face_idx, mtrl_idx in enumerate(face_materials):
+            if mtrl_idx in slot_indices:
                 tex_layer.data[face_idx].image = materials[mtrl_idx]["image"]
 
     # add mirror modifier
@@ -395,32 +536,19 @@ def import_object(mqo_obj, materials, vertex_weight_import_options):
                 if axis_index & 0x4:
                     new_obj.modifiers["Mirror"].use_z = True
 
-    # Set vertex normals.
+    # Set custom split normals.
     bpy.ops.object.mode_set(mode='OBJECT')
-    vert_to_face_normals = {}
-    for mqo_face in mqo_faces:
-        if mqo_face.normals is not None:
-            for i, vidx in enumerate(mqo_face.vertex_indices):
-                if vidx not in vert_to_face_normals:
-                    vert_to_face_normals[vidx] = []
-                vert_to_face_normals[vidx].append(Vector(mqo_face.normals[i]))
-    if len(vert_to_face_normals) == len(mqo_verts):
-        vert_normals = []
-        for v in new_mesh.vertices:
-            vert_normal = Vector()
-            for normal in vert_to_face_normals[v.index]:
-                vert_normal += normal
-            vert_normal.normalize()
-            vert_normals.append(-vert_normal)
-        new_mesh.normals_split_custom_set_from_vertices(vert_normals)
+    loop_normals = make_loop_normals(mqo_face_buffer, mqo_face_indices,
+                                     loop_sources, len(new_mesh.loops))
+    if loop_normals is not None:
+        new_mesh.normals_split_custom_set(loop_normals)
     else:
-        new_mesh.normals_split_custom_set_from_vertices(
-            [Vector((0, 0, 0)) for _ in new_mesh.vertices])
-
-    # Flip normals are requied to match between Blender and Metasequoia.
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.flip_normals()
-    bpy.ops.object.mode_set(mode='OBJECT')
+        vert_normals = make_vertex_normals(
+            mqo_face_buffer, mqo_face_indices,
+            len(mqo_obj.get_vertex_buffer()) // 3, len(new_mesh.vertices))
+        if vert_normals is None:
+            vert_normals = [(0.0, 0.0, 0.0)] * len(new_mesh.vertices)
+        new_mesh.normals_split_custom_set_from_vertices(vert_normals)
 
     new_obj.delta_rotation_euler = (math.radians(90), 0, 0)
     new_obj.delta_scale = (0.01, 0.01, 0.01)
@@ -440,10 +568,29 @@ def import_objects(mqo_file, exclude_objects, materials,
     return objects_imported
 
 
+def get_parse_cache(prefs):
+    if not prefs.use_parse_cache or not prefs.parse_cache_directory:
+        return None
+    return mqo.ParseCache(bpy.path.abspath(prefs.parse_cache_directory),
+                          prefs.parse_cache_size_limit * 1024 * 1024)
+
+
+# pylint: disable=too-many-arguments
 def import_mqo_file(filepath, exclude_objects, exclude_materials,
-                    import_prefix, vertex_weight_import_options):
+                    import_prefix, vertex_weight_import_options, *,
+                    parse_cache=None, max_workers=None):
     mqo_file = mqo.MqoFile()
-    mqo_file.load(filepath)
+    # Excluded objects are not parsed unless the cache or the parallel
+    # parsing is used.
+    mqo_file.load(filepath, lazy=True, cache=parse_cache,
+                  max_workers=max_workers)
+
+    # Parse the objects to import before creating anything, so that a broken
+    # object chunk does not leave a partially imported scene.
+    for mqo_obj in mqo_file.get_objects():
+        if mqo_obj.name not in exclude_objects and \
+                isinstance(mqo_obj, mqo.LazyObject):
+            mqo_obj.load()
 
     orig_mode = compat.get_object_mode(bpy.context)
     if bpy.ops.object.mode_set.poll() and orig_mode != 'OBJECT':
@@ -603,7 +750,8 @@ def attach_texture_to_material(mqo_file, exclude_objects, exclude_materials,
 
 
 def export_mqo_file(filepath, exclude_objects, exclude_materials,
-                    export_prefix, vertex_weight_export_options):
+                    export_prefix, vertex_weight_export_options, *,
+                    compress_level=None, binary_vertex=False):
     mqo_file = mqo.MqoFile()
     mqo_file.version = "1.1"
     mqo_file.format = "Text"
@@ -648,11 +796,6 @@ def export_mqo_file(filepath, exclude_objects, exclude_materials,
         for mod in copied_obj.modifiers:
             bpy.ops.object.modifier_apply(modifier=mod.name)
 
-        # Revert normal to match MQO format.
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.flip_normals()
-        bpy.ops.object.mode_set(mode='OBJECT')
-
         mqo_obj = mqo.Object()
         mqo_obj.name = obj.name
 
@@ -663,20 +806,31 @@ def export_mqo_file(filepath, exclude_objects, exclude_materials,
             mqo_obj.add_vertex([v.co[0], v.co[1], v.co[2]])
 
         # faces
-        for face in me.polygons:
-            mqo_face = mqo.Face()
-            mqo_face.ngons = len(face.vertices)
-            mqo_face.vertex_indices = [v for v in face.vertices]    # pylint: disable=R1721 # noqa
-            if len(me.uv_layers.keys()) > 0:
-                uv_layer = me.uv_layers.active
-                for li in list(face.loop_indices):
-                    if li >= len(uv_layer.data):
-                        continue
-                    uv = uv_layer.data[li].uv
-                    if mqo_face.uv_coords is None:
-                        mqo_face.uv_coords = []
-                    mqo_face.uv_coords.append([uv[0], 1 - uv[1]])
-            mqo_obj.add_face(mqo_face)
+        loop_starts = array.array('i', bytes(4 * len(me.polygons)))
+        loop_totals = array.array('i', bytes(4 * len(me.polygons)))
+        me.polygons.foreach_get("loop_start", loop_starts)
+        me.polygons.foreach_get("loop_total", loop_totals)
+        loop_vertex_indices = array.array('i', bytes(4 * len(me.loops)))
+        me.loops.foreach_get("vertex_index", loop_vertex_indices)
+        loop_uvs = None
+        if len(me.uv_layers.keys()) > 0:
+            loop_uvs = array.array('f', bytes(8 * len(me.loops)))
+            me.uv_layers.active.data.foreach_get("uv", loop_uvs)
+        face_buffer = mqo.FaceBuffer()
+        for start, total in zip(loop_starts, loop_totals):
+            # Reverse the winding order to match MQO format.
+            loops = reverse_winding(list(range(start, start + total)))
+            uv_coords = None
+            if loop_uvs is not None:
+                uv_coords = []
+                for li in loops:
+                    uv_coords.extend([loop_uvs[li * 2],
+                                      1 - loop_uvs[li * 2 + 1]])
+            face_buffer.append(
+                total, vertex_indices=[loop_vertex_indices[li]
+                                       for li in loops],
+                uv_coords=uv_coords)
+        mqo_obj.add_faces(face_buffer)
 
         bpy.ops.object.mode_set(mode='EDIT')
 
@@ -741,8 +895,7 @@ def export_mqo_file(filepath, exclude_objects, exclude_materials,
         for i, mqo_face in enumerate(mqo_obj.get_faces()):
             vert_normals = []
             for vidx in mqo_face.vertex_indices:
-                # Minus normal to match MQO format.
-                vert_normals.append(-me.vertices[vidx].normal)
+                vert_normals.append(me.vertices[vidx].normal)
 
             face_normal = Vector()
             for normal in vert_normals:
@@ -772,7 +925,7 @@ def export_mqo_file(filepath, exclude_objects, exclude_materials,
     for mqo_mtrl in mqo_file.get_materials():
         mqo_mtrl.name = "{}{}".format(export_prefix, mqo_mtrl.name)
 
-    mqo_file.save(filepath)
+    mqo_file.save(filepath, compress_level, binary_vertex)
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode=orig_mode)
 
@@ -866,7 +1019,8 @@ class BLMQO_OT_ImportMqo(bpy.types.Operator, ImportHelper):
             self.num_valid_materials = 0
             mqo_file = mqo.MqoFile()
             try:
-                mqo_file.load(self.properties.filepath)
+                # Only names are needed, so object chunks are not parsed.
+                mqo_file.load(self.properties.filepath, lazy=True)
                 self.is_valid_mqo_file = True
             except:     # noqa
                 self.is_valid_mqo_file = False
@@ -980,10 +1134,19 @@ class BLMQO_OT_ImportMqo(bpy.types.Operator, ImportHelper):
             self.vertex_weights_grouped_by,
             self.vertex_weights_group_name
         )
-        import_mqo_file(self.properties.filepath,
-                        exclude_objects, exclude_materials,
-                        self.import_prefix if self.add_import_prefix else "",
-                        vertex_weight_import_options)
+        try:
+            import_mqo_file(
+                self.properties.filepath, exclude_objects, exclude_materials,
+                self.import_prefix if self.add_import_prefix else "",
+                vertex_weight_import_options,
+                parse_cache=get_parse_cache(prefs),
+                max_workers=prefs.parse_workers)
+        except (RuntimeError, ValueError) as e:
+            # Raised when the object chunks are broken.
+            self.report({'WARNING'},
+                        "Failed to import: {} (file: {})"
+                        .format(e, self.properties.filepath))
+            return {'CANCELLED'}
 
         self.report({'INFO'},
                     "Imported from {}".format(self.properties.filepath))
@@ -1053,7 +1216,7 @@ class BLMQO_OT_ExportMqo(bpy.types.Operator, ExportHelper):
     bl_options = {'REGISTER', 'UNDO'}
 
     filename_ext = ".mqo"
-    filter_glob = StringProperty(default="*.mqo", options={'HIDDEN'})
+    filter_glob = StringProperty(default="*.mqo;*.mqoz", options={'HIDDEN'})
 
     def get_objects_for_vertex_weights(self, context):
         # TODO: select only objects to export.
@@ -1101,6 +1264,36 @@ class BLMQO_OT_ExportMqo(bpy.types.Operator, ExportHelper):
         default=True
     )
     export_prefix = StringProperty(name="Prefix", default="[Exported] ")
+    binary_vertex = BoolProperty(
+        name="Binary Vertices",
+        description="Export vertices as binary (BVertex), which keeps "
+                    "single precision and makes file smaller",
+        default=False
+    )
+    compress = BoolProperty(
+        name="Compress (.mqoz)",
+        description="Export as a compressed Metasequoia file (.mqoz)",
+        default=False
+    )
+    compression_level = IntProperty(
+        name="Compression Level",
+        description="Higher level makes smaller file, but takes more time",
+        default=6,
+        min=0,
+        max=9
+    )
+
+    def check(self, _):
+        # Extension follows the compression option instead of filename_ext.
+        filepath = self.properties.filepath
+        if not os.path.basename(filepath):
+            return False
+        ext = ".mqoz" if self.compress else ".mqo"
+        new_filepath = os.path.splitext(filepath)[0] + ext
+        if new_filepath == filepath:
+            return False
+        self.properties.filepath = new_filepath
+        return True
 
     def draw(self, _):
         layout = self.layout
@@ -1156,6 +1349,10 @@ class BLMQO_OT_ExportMqo(bpy.types.Operator, ExportHelper):
         layout.prop(self, "add_export_prefix")
         if self.add_export_prefix:
             layout.prop(self, "export_prefix")
+        layout.prop(self, "binary_vertex")
+        layout.prop(self, "compress")
+        if self.compress:
+            layout.prop(self, "compression_level")
 
     def execute(self, _):
         if not self.properties.filepath:
@@ -1204,10 +1401,13 @@ class BLMQO_OT_ExportMqo(bpy.types.Operator, ExportHelper):
         vertex_weight_export_options = VertexWeightExportOptions(
             self.export_vertex_weights, vertex_groups
         )
+        self.check(None)
         export_mqo_file(self.properties.filepath, exclude_objects,
                         exclude_materials,
                         self.export_prefix if self.add_export_prefix else "",
-                        vertex_weight_export_options)
+                        vertex_weight_export_options,
+                        compress_level=self.compression_level,
+                        binary_vertex=self.binary_vertex)
 
         self.report({'INFO'},
                     "Exported to {}".format(self.properties.filepath))
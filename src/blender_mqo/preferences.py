@@ -101,6 +101,34 @@ class BLMQO_Preferences(bpy.types.AddonPreferences):
         max=10000,
         min=10
     )
+    use_parse_cache = BoolProperty(
+        name="Use Parse Cache",
+        description="Cache parsed .mqo/.mqoz files to speed up re-import",
+        default=False
+    )
+    parse_cache_directory = StringProperty(
+        name="Cache Directory",
+        description="Directory to store the parse cache",
+        default="",
+        subtype='DIR_PATH'
+    )
+    parse_cache_size_limit = IntProperty(
+        name="Cache Size Limit (MB)",
+        description="Least recently used files are removed from the cache "
+                    "when the total size exceeds this limit",
+        default=512,
+        max=65536,
+        min=1
+    )
+    parse_workers = IntProperty(
+        name="Parse Workers",
+        description="Number of processes to parse the objects of .mqo file "
+                    "in parallel. All objects are parsed if more than 1, "
+                    "even if they are not imported",
+        default=1,
+        max=64,
+        min=1
+    )
 
     def draw(self, _):
         layout = self.layout
@@ -117,6 +145,19 @@ class BLMQO_Preferences(bpy.types.AddonPreferences):
             col.prop(self, "importable_materials_limit")
             col.enabled = self.selective_import
 
+            layout.separator()
+
+            layout.prop(self, "use_parse_cache")
+            sp = compat.layout_split(layout, factor=0.5)
+            col = sp.column()
+            col.prop(self, "parse_cache_directory")
+            col.prop(self, "parse_cache_size_limit")
+            col.enabled = self.use_parse_cache
+
+            layout.separator()
+
+            layout.prop(self, "parse_workers")
+
 # extensions.blender.org: Delete block start
         elif self.category == 'UPDATE':
             updater = AddonUpdaterManager.get_instance()
@@ -1,25 +1,150 @@
+import io
 import re
+import os
+import sys
+import time
+import argparse
+import json
 import math
+import mmap
+import array
 import struct
+import hashlib
 import pathlib
 import zipfile
+import warnings
+import itertools
+import concurrent.futures
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 ALLOWABLE_ERROR = 1e-5
 INDENT = "    "
+# Number of lines which are joined before written to the stream.
+WRITE_BATCH_LINES = 4096
+
+# Regular expressions used by the parsers, compiled once at import time.
+# Each table is keyed by the keyword of the field which the pattern parses.
+CHUNK_HEADER_RGX = {
+    b"Format": re.compile(rb"Format (Text|Compress) Ver ([0-9]+\.[0-9]+)"),
+    b"IncludeXml": re.compile(rb"IncludeXml \"(.+)\""),
+    b"dirlights": re.compile(rb"dirlights ([0-9]+) {"),
+    b"Material": re.compile(rb"Material ([0-9]+) {"),
+    b"Object": re.compile(rb"Object \"*([^\"]+)\"* {"),
+    b"vertex": re.compile(rb"vertex ([0-9]+) {"),
+    b"BVertex": re.compile(rb"BVertex ([0-9]+) {"),
+    b"Vector": re.compile(rb"Vector ([0-9]+) \[([0-9]+)\]"),
+    b"face": re.compile(rb"face ([0-9]+)\s*{"),
+}
+
+LIGHT_FIELD_RGX = {
+    b"dir": re.compile(rb"dir ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"),
+    b"color": re.compile(rb"color ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"),
+}
+
+SCENE_FIELD_RGX = {
+    b"pos": re.compile(rb"pos ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"),
+    b"lookat": re.compile(rb"lookat ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"),
+    b"head": re.compile(rb"head ([-0-9\.]+)"),
+    b"pich": re.compile(rb"pich ([-0-9\.]+)"),
+    b"bank": re.compile(rb"bank ([-0-9\.]+)"),
+    b"ortho": re.compile(rb"ortho ([0-9\.]+)"),
+    b"zoom2": re.compile(rb"zoom2 ([0-9\.]+)"),
+    b"amb": re.compile(rb"amb ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"),
+    b"frontclip": re.compile(rb"frontclip ([0-9\.]+)"),
+    b"backclip": re.compile(rb"backclip ([0-9\.]+)"),
+}
+
+MATERIAL_FIELD_RGX = {
+    b"name": re.compile(rb"\"([^\"]*)\""),
+    b"shader": re.compile(rb"\"[^\"]*\" .*shader\(([0-4])\)"),
+    b"vcol": re.compile(rb"\"[^\"]*\" .*vcol\(([0-1])\)"),
+    b"dbls": re.compile(rb"\"[^\"]*\" .*dbls\(([0-1])\)"),
+    b"col": re.compile(rb"\"[^\"]*\" .*col\(([0-1]\.[0-9]+) "
+                       rb"([0-1]\.[0-9]+) ([0-1]\.[0-9]+) "
+                       rb"([0-1]\.[0-9]+)\)"),
+    b"dif": re.compile(rb"\"[^\"]*\" .*dif\(([0-1]\.[0-9]+)\)"),
+    b"amb": re.compile(rb"\"[^\"]*\" .*amb\(([0-1]\.[0-9]+)\)"),
+    b"emi": re.compile(rb"\"[^\"]*\" .*emi\(([0-1]\.[0-9]+)\)"),
+    b"spc": re.compile(rb"\"[^\"]*\" .*spc\(([0-1]\.[0-9]+)\)"),
+    b"power": re.compile(rb"\"[^\"]*\" .*power\(([0-9]+\.[0-9]+)\)"),
+    b"reflect": re.compile(rb"\"[^\"]*\" .*reflect\(([0-1]\.[0-9]+)\)"),
+    b"refract": re.compile(rb"\"[^\"]*\" .*refract\(([1-5]\.[0-9]+)\)"),
+    b"tex": re.compile(rb"\"[^\"]*\" .*tex\(\"([^\)]+)\"\)"),
+    b"aplane": re.compile(rb"\"[^\"]*\" .*aplane\(\"([^\)]+)\"\)"),
+    b"bump": re.compile(rb"\"[^\"]*\" .*bump\(\"([^\)]+)\"\)"),
+    b"proj_type": re.compile(rb"\"[^\"]*\" .*proj_type\(([0-3])\)"),
+    b"proj_pos": re.compile(rb"\"[^\"]*\" .*proj_pos\((-?[0-9]+\.[0-9]+) "
+                            rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)"),
+    b"proj_scale": re.compile(rb"\"[^\"]*\" "
+                              rb".*proj_scale\((-?[0-9]+\.[0-9]+) "
+                              rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)"),
+    b"proj_angle": re.compile(rb"\"[^\"]*\" "
+                              rb".*proj_angle\((-?[0-9]+\.[0-9]+) "
+                              rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)"),
+}
+
+OBJECT_FIELD_RGX = {
+    b"uid": re.compile(rb"uid ([0-9]+)"),
+    b"depth": re.compile(rb"depth ([0-9]+)"),
+    b"folding": re.compile(rb"folding ([0-1])"),
+    b"scale": re.compile(rb"scale ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"),
+    b"rotation": re.compile(rb"rotation ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"),
+    b"translation": re.compile(
+        rb"translation ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"),
+    b"patch": re.compile(rb"patch ([0-4])"),
+    b"patchtri": re.compile(rb"patchtri ([0-1])"),
+    b"segment": re.compile(rb"segment ([0-9]+)"),
+    b"visible": re.compile(rb"visible ([0-9]+)"),
+    b"locking": re.compile(rb"locking ([0-1])"),
+    b"shading": re.compile(rb"shading ([0-1])"),
+    b"facet": re.compile(rb"facet ([0-9\.]+)"),
+    b"color": re.compile(rb"color ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"),
+    b"color_type": re.compile(rb"color_type ([0-1])"),
+    b"mirror": re.compile(rb"mirror ([0-2])"),
+    b"mirror_axis": re.compile(rb"mirror_axis ([1-7])"),
+    b"mirror_dis": re.compile(rb"mirror_dis ([0-9\.]+)"),
+    b"lathe": re.compile(rb"lathe ([0-3])"),
+    b"lathe_axis": re.compile(rb"lathe_axis ([0-2])"),
+    b"lathe_seg": re.compile(rb"lathe_seg ([0-9]+)"),
+    b"normal_weight": re.compile(rb"normal_weight ([0-9\.]+)"),
+}
+
+WEIT_RGX = re.compile(rb"([0-9]+) (-*[0-9\.]+)")
 
 
 class RawData:
     def __init__(self, data):
+        # 'data' is bytes or a read-only mmap.mmap object.
         self.data = data
         self.seek = 0
 
+    @classmethod
+    def from_file(cls, f, use_mmap=True):
+        size = os.fstat(f.fileno()).st_size
+        # Empty file can not be mapped.
+        if not use_mmap or size == 0:
+            return cls(f.read())
+
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(data, "madvise"):
+            # Pages are read almost sequentially while parsing.
+            data.madvise(mmap.MADV_SEQUENTIAL)
+        return cls(data)
+
     def get_line(self):
-        idx = self.data[self.seek:].find(b'\n')
-        if idx == -1:
-            idx = len(self.data[self.seek:]) - 1
+        # Search from the current position instead of slicing the rest of
+        # the data, which copies the remaining buffer on every line.
         start = self.seek
-        end = self.seek + idx + 1
+        end = self.data.find(b'\n', start)
+        if end == -1:
+            end = len(self.data)
+        else:
+            end += 1
         self.seek = end
 
         return self.data[start:end]
@@ -30,8 +155,304 @@ class RawData:
         self.seek = end
         return self.data[start:end]
 
+    def read_array(self, typecode, count):
+        """Read count items into array.array without making an intermediate
+        bytes object."""
+
+        buffer = array.array(typecode)
+        num_bytes = buffer.itemsize * count
+        view = memoryview(self.data)[self.seek:self.seek + num_bytes]
+        try:
+            if len(view) != num_bytes:
+                raise RuntimeError("Unexpected end of data.")
+            buffer.frombytes(view)
+        finally:
+            # Exported buffer prevents mmap from being closed.
+            view.release()
+        self.seek += num_bytes
+        return buffer
+
+    def skip(self, num_bytes):
+        """Advance num_bytes without copying. Returns whether num_bytes
+        are left in the data."""
+
+        end = self.seek + num_bytes
+        if end > len(self.data):
+            self.seek = len(self.data)
+            return False
+        self.seek = end
+        return True
+
+    def read_until(self, delimiter):
+        """Read up to the delimiter. The delimiter is left unread.
+        Returns None if the delimiter is not found."""
+
+        end = self.data.find(delimiter, self.seek)
+        if end == -1:
+            return None
+        start = self.seek
+        self.seek = end
+        return self.data[start:end]
+
+    def skip_until(self, delimiter):
+        """Same as read_until, but nothing is copied. Returns whether the
+        delimiter is found."""
+
+        end = self.data.find(delimiter, self.seek)
+        if end == -1:
+            return False
+        self.seek = end
+        return True
+
+    def eof(self):
+        return self.seek >= len(self.data)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class StreamRawData:
+    """RawData compatible reader over a file-like object.
+
+    Only a window of the stream is held in memory. Consumed data is dropped
+    when the window is refilled, so the memory usage is bounded by the
+    chunk size and the longest line.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.data = b""
+        self.seek = 0
+        self.exhausted = False
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.exhausted = True
+            return False
+        self.data = self.data[self.seek:] + chunk
+        self.seek = 0
+        return True
+
+    def get_line(self):
+        search_start = self.seek
+        end = self.data.find(b'\n', search_start)
+        while end == -1:
+            search_start = len(self.data) - self.seek
+            if not self._fill():
+                end = len(self.data)
+                break
+            end = self.data.find(b'\n', search_start)
+        else:
+            end += 1
+        start = self.seek
+        self.seek = end
+
+        return self.data[start:end]
+
+    def read(self, num_bytes):
+        available = len(self.data) - self.seek
+        if available >= num_bytes:
+            start = self.seek
+            self.seek += num_bytes
+            return self.data[start:self.seek]
+
+        # Read the rest directly from the stream and join once, so that the
+        # window is not copied for each chunk.
+        parts = [self.data[self.seek:]]
+        remaining = num_bytes - available
+        while remaining > 0:
+            chunk = self.stream.read(remaining)
+            if not chunk:
+                self.exhausted = True
+                break
+            parts.append(chunk)
+            remaining -= len(chunk)
+        self.data = b""
+        self.seek = 0
+        return b"".join(parts)
+
+    def read_array(self, typecode, count):
+        buffer = array.array(typecode)
+        data = self.read(buffer.itemsize * count)
+        if len(data) != buffer.itemsize * count:
+            raise RuntimeError("Unexpected end of data.")
+        buffer.frombytes(data)
+        return buffer
+
+    def skip(self, num_bytes):
+        available = len(self.data) - self.seek
+        if available >= num_bytes:
+            self.seek += num_bytes
+            return True
+
+        # Discard the rest of the payload chunk by chunk.
+        remaining = num_bytes - available
+        self.data = b""
+        self.seek = 0
+        while remaining > 0:
+            chunk = self.stream.read(min(remaining, self.chunk_size))
+            if not chunk:
+                self.exhausted = True
+                return False
+            remaining -= len(chunk)
+        return True
+
+    def read_until(self, delimiter):
+        # The whole block up to the delimiter is held in memory.
+        end = self.data.find(delimiter, self.seek)
+        if end != -1:
+            start = self.seek
+            self.seek = end
+            return self.data[start:end]
+
+        # Collect the chunks and join once, so that the block is not copied
+        # for each chunk. Only the new chunk and the tail of the previous
+        # one, which may be the head of the delimiter, are searched.
+        overlap = len(delimiter) - 1
+        parts = [self.data[self.seek:]]
+        tail = parts[0][len(parts[0]) - overlap:] if overlap else b""
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self.exhausted = True
+                self.data = b"".join(parts)
+                self.seek = 0
+                return None
+            searched = tail + chunk
+            pos = searched.find(delimiter)
+            if pos != -1:
+                # Position relative to the head of the chunk.
+                pos -= len(tail)
+                break
+            parts.append(chunk)
+            tail = searched[len(searched) - overlap:] if overlap else b""
+
+        if pos >= 0:
+            parts.append(chunk[:pos])
+            self.data = chunk[pos:]
+            block = b"".join(parts)
+        else:
+            # The delimiter starts in the previous chunk.
+            block = b"".join(parts)
+            self.data = block[len(block) + pos:] + chunk
+            block = block[:len(block) + pos]
+        self.seek = 0
+        return block
+
+    def skip_until(self, delimiter):
+        search_start = self.seek
+        end = self.data.find(delimiter, search_start)
+        while end == -1:
+            # Keep the tail which may be the head of the delimiter.
+            self.seek = max(len(self.data) - len(delimiter) + 1, self.seek)
+            search_start = 0
+            if not self._fill():
+                return False
+            end = self.data.find(delimiter, search_start)
+        self.seek = end
+        return True
+
     def eof(self):
-        return len(self.data) == self.seek
+        while self.seek >= len(self.data):
+            if self.exhausted or not self._fill():
+                return True
+        return False
+
+    def close(self):
+        self.data = b""
+        self.seek = 0
+
+
+def parse_float_block(block):
+    """Convert a block of whitespace separated numbers into array('d') at
+    once. NumPy is used to convert when it is available."""
+
+    # numpy.fromstring() returns [-1.0] for a block without numbers.
+    if not block.strip():
+        return array.array('d')
+
+    if numpy is not None:
+        with warnings.catch_warnings():
+            # Unparsable data is reported as DeprecationWarning.
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = numpy.fromstring(block, dtype=numpy.float64,
+                                          sep=" ")
+            except (ValueError, DeprecationWarning) as e:
+                raise RuntimeError("Invalid format. (block:{})"
+                                   .format(block[:80])) from e
+        buffer = array.array('d')
+        buffer.frombytes(values.tobytes())
+        return buffer
+
+    try:
+        return array.array('d', map(float, block.split()))
+    except ValueError as e:
+        raise RuntimeError("Invalid format. (block:{})"
+                           .format(block[:80])) from e
+
+
+class FlatVectorView:
+    """Read only sequence which shows a flat buffer [x0, y0, z0, x1, ...]
+    as a list of vectors [[x0, y0, z0], [x1, ...], ...]."""
+
+    def __init__(self, buffer, size):
+        self._buffer = buffer
+        self._size = size
+
+    def __len__(self):
+        return len(self._buffer) // self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        start = index * self._size
+        return [float(v) for v in self._buffer[start:start + self._size]]
+
+    def __iter__(self):
+        buf = self._buffer
+        size = self._size
+        for start in range(0, len(buf) - size + 1, size):
+            yield [float(v) for v in buf[start:start + size]]
+
+
+def split_face_line(line):
+    """Split a face line into the number of vertices and (tag, value)
+    pairs, walking the line only once.
+
+    b"3 V(0 1 2) M(0)" -> 3, [(b"V", b"0 1 2"), (b"M", b"0")]
+    """
+
+    # Any whitespace (e.g. tab) may separate the number of vertices.
+    parts = line.split(None, 1)
+    try:
+        ngons = int(parts[0])
+    except (IndexError, ValueError) as e:
+        raise RuntimeError("Failed to find number of vertices. (line:{})"
+                           .format(line)) from e
+    rest = parts[1] if len(parts) == 2 else b""
+
+    fields = []
+    start = 0
+    while True:
+        open_ = rest.find(b"(", start)
+        if open_ == -1:
+            break
+        close = rest.find(b")", open_)
+        if close == -1:
+            raise RuntimeError("Unclosed parenthesis. (line:{})"
+                               .format(line))
+        fields.append((rest[start:open_].strip(), rest[open_ + 1:close]))
+        start = close + 1
+
+    return ngons, fields
 
 
 def remove_return(line):
@@ -40,22 +461,32 @@ def remove_return(line):
     return line
 
 
-def decode(str_):
-    lookup = [
-        "utf-8", "enc_jp", "euc_jis_2004", "euc_jisx0213", "shift_jis",
-        "shift_jis_2004", "shift_jisx0213", "iso2022jp", "iso2022_jp_1",
-        "iso2022_jp_2", "iso2022_jp_3", "iso2022_jp_ext", "latin_1", "ascii"
-    ]
-    for enc in lookup:
+ENCODINGS = [
+    "utf-8", "enc_jp", "euc_jis_2004", "euc_jisx0213", "shift_jis",
+    "shift_jis_2004", "shift_jisx0213", "iso2022jp", "iso2022_jp_1",
+    "iso2022_jp_2", "iso2022_jp_3", "iso2022_jp_ext", "latin_1", "ascii"
+]
+
+
+def detect_encoding(str_):
+    for enc in ENCODINGS:
         try:
-            decoded_str = str_.decode(enc)
-            break
+            str_.decode(enc)
+            return enc
         except:     # noqa
             pass
-    else:
-        raise RuntimeError("Failed to encoding.")
 
-    return decoded_str
+    raise RuntimeError("Failed to encoding.")
+
+
+def decode(str_, encoding=None):
+    if encoding is not None:
+        try:
+            return str_.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+
+    return str_.decode(detect_encoding(str_))
 
 
 # pylint: disable=too-many-return-statements
@@ -84,6 +515,8 @@ def is_same(var1, var2, allowable_erorr=ALLOWABLE_ERROR):
 
 
 class DirLight:
+    __slots__ = ("_dir", "_color")
+
     def __init__(self):
         self._dir = None
         self._color = None
@@ -109,30 +542,26 @@ class DirLight:
         self._color = color_
 
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR):
-        self_keys = list(self.__dict__.keys())
-        other_keys = list(other.__dict__.keys())
-
-        if len(self_keys) != len(other_keys):
-            return False
-
-        for key in self_keys:
-            if key not in other_keys:
-                return False
-            if not is_same(self.__dict__[key], other.__dict__[key],
+        for key in self.__slots__:
+            if not is_same(getattr(self, key), getattr(other, key),
                            allowable_error):
                 return False
 
         return True
 
     def to_str(self, fmt='STDOUT'):
-        s = ""
-        if fmt == 'MQO_FILE':
-            s += INDENT * 2 + "light {\n"
-            s += INDENT * 3 + "dir {:.3f} {:.3f} {:.3f}\n".format(*self._dir)
-            s += INDENT * 3 + "color {:.3f} {:.3f} {:.3f}\n"\
-                              .format(*self._color)
-            s += INDENT * 2 + "}\n"
-        return s
+        if fmt != 'MQO_FILE':
+            return ""
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+    def write(self, out):
+        out.write(INDENT * 2 + "light {\n")
+        out.write(INDENT * 3 + "dir {:.3f} {:.3f} {:.3f}\n".format(*self._dir))
+        out.write(INDENT * 3 + "color {:.3f} {:.3f} {:.3f}\n"
+                  .format(*self._color))
+        out.write(INDENT * 2 + "}\n")
 
     def set_default_params(self):
         self._dir = [0.408, 0.408, 0.816]
@@ -140,6 +569,9 @@ class DirLight:
 
 
 class Scene:
+    __slots__ = ("_pos", "_lookat", "_head", "_pich", "_bank", "_ortho",
+                 "_zoom2", "_amb", "_frontclip", "_backclip", "_dirlights")
+
     def __init__(self):
         self._pos = None
         self._lookat = None
@@ -257,63 +689,61 @@ class Scene:
         self._dirlights.append(light)
 
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR):
-        self_keys = list(self.__dict__.keys())
-        other_keys = list(other.__dict__.keys())
-
-        if len(self_keys) != len(other_keys):
-            return False
-
-        self_keys.remove("dirlights")
-        other_keys.remove("dirlights")
-
-        for key in self_keys:
-            if key not in other_keys:
-                return False
-            if not is_same(self.__dict__[key], other.__dict__[key],
+        for key in self.__slots__:
+            if key == "_dirlights":
+                continue
+            if not is_same(getattr(self, key), getattr(other, key),
                            allowable_error):
                 return False
 
-        for sd, od in zip(self._dirlights, other.dirlights):
+        # pylint: disable=protected-access
+        if len(self._dirlights) != len(other._dirlights):
+            return False
+        for sd, od in zip(self._dirlights, other._dirlights):
             if not sd.is_same(od):
                 return False
 
         return True
 
     def to_str(self, fmt='STDOUT'):
-        s = ""
-        if fmt == 'MQO_FILE':
-            s += "Scene {\n"
-            if self._pos is not None:
-                s += INDENT + "pos {:.4f} {:.4f} {:.4f}\n".format(*self._pos)
-            if self._lookat is not None:
-                s += INDENT
-                s += "lookat {:.4f} {:.4f} {:.4f}\n".format(*self._lookat)
-            if self._head is not None:
-                s += INDENT + "head {:.4f}\n".format(self._head)
-            if self._pich is not None:
-                s += INDENT + "pich {:.4f}\n".format(self._pich)
-            if self._bank is not None:
-                s += INDENT + "bank {:.4f}\n".format(self._bank)
-            if self._ortho is not None:
-                s += INDENT + "ortho {}\n".format(self._ortho)
-            if self._zoom2 is not None:
-                s += INDENT + "zoom2 {:.4f}\n".format(self._zoom2)
-            if self._amb is not None:
-                s += INDENT + "amb {:.3f} {:.3f} {:.3f}\n".format(*self._amb)
-            if self._frontclip is not None:
-                s += INDENT + "frontclip {:.5f}\n".format(self._frontclip)
-            if self._backclip is not None:
-                s += INDENT + "backclip {}\n".format(self._backclip)
-            if len(self._dirlights) > 0:
-                s += INDENT
-                s += "dirlight {}".format(len(self._dirlights))
-                s += " {\n"
-                for light in self._dirlights:
-                    s += light.to_str(fmt)
-                s += INDENT + "}\n"
-            s += "}\n"
-
-        return s
+        if fmt != 'MQO_FILE':
+            return ""
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+    def write(self, out):
+        """Write the Scene chunk to the text stream."""
+
+        out.write("Scene {\n")
+        if self._pos is not None:
+            out.write(INDENT + "pos {:.4f} {:.4f} {:.4f}\n".format(*self._pos))
+        if self._lookat is not None:
+            out.write(INDENT + "lookat {:.4f} {:.4f} {:.4f}\n"
+                      .format(*self._lookat))
+        if self._head is not None:
+            out.write(INDENT + "head {:.4f}\n".format(self._head))
+        if self._pich is not None:
+            out.write(INDENT + "pich {:.4f}\n".format(self._pich))
+        if self._bank is not None:
+            out.write(INDENT + "bank {:.4f}\n".format(self._bank))
+        if self._ortho is not None:
+            out.write(INDENT + "ortho {}\n".format(self._ortho))
+        if self._zoom2 is not None:
+            out.write(INDENT + "zoom2 {:.4f}\n".format(self._zoom2))
+        if self._amb is not None:
+            out.write(INDENT + "amb {:.3f} {:.3f} {:.3f}\n".format(*self._amb))
+        if self._frontclip is not None:
+            out.write(INDENT + "frontclip {:.5f}\n".format(self._frontclip))
+        if self._backclip is not None:
+            out.write(INDENT + "backclip {}\n".format(self._backclip))
+        if len(self._dirlights) > 0:
+            out.write(INDENT + "dirlight {}".format(len(self._dirlights))
+                      + " {\n")
+            for light in self._dirlights:
+                light.write(out)
+            out.write(INDENT + "}\n")
+        out.write("}\n")
 
     def set_default_params(self):
         self._pos = [0, 0, 1500]
@@ -332,6 +762,12 @@ class Scene:
 
 
 class Material:
+    __slots__ = ("_name", "_shader", "_vertex_color", "_doubles", "_color",
+                 "_diffuse", "_ambient", "_emissive", "_specular", "_power",
+                 "_reflect", "_refract", "_texture_map", "_alpha_plane_map",
+                 "_bump_map", "_projection_type", "_projection_pos",
+                 "_projection_scale", "_projection_angle")
+
     def __init__(self):
         self._name = None
         self._shader = None
@@ -544,68 +980,65 @@ class Material:
         self._projection_angle = projection_angle_
 
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR):
-        self_keys = list(self.__dict__.keys())
-        other_keys = list(other.__dict__.keys())
-
-        if len(self_keys) != len(other_keys):
-            return False
-
-        for key in self_keys:
-            if key not in other_keys:
-                return False
-            if not is_same(self.__dict__[key], other.__dict__[key],
+        for key in self.__slots__:
+            if not is_same(getattr(self, key), getattr(other, key),
                            allowable_error):
                 return False
 
         return True
 
     def to_str(self, fmt='STDOUT'):
-        s = ""
-        if fmt == 'MQO_FILE':
-            s = INDENT + "\"{}\"".format(self._name)
-            if self._shader is not None:
-                s += " shader({})".format(self._shader)
-            if self._vertex_color is not None:
-                s += " vcol({})".format(self._vertex_color)
-            if self._doubles is not None:
-                s += " dbls({})".format(self._doubles)
-            if self._color is not None:
-                s += " col({:.3f} {:.3f} {:.3f} {:.3f})"\
-                     .format(*self._color)
-            if self._diffuse is not None:
-                s += " dif({:.3f})".format(self._diffuse)
-            if self._ambient is not None:
-                s += " amb({:.3f})".format(self._ambient)
-            if self._emissive is not None:
-                s += " emi({:.3f})".format(self._emissive)
-            if self._specular is not None:
-                s += " spc({:.3f})".format(self.specular)
-            if self._power is not None:
-                s += " power({:.2f})".format(self._power)
-            if self._reflect is not None:
-                s += " reflect({:.3f})".format(self._reflect)
-            if self._refract is not None:
-                s += " refract({:.3f})".format(self._refract)
-            if self._texture_map is not None:
-                s += " tex(\"{}\")".format(self._texture_map)
-            if self._alpha_plane_map is not None:
-                s += " aplane(\"{}\")".format(self._alpha_plane_map)
-            if self._bump_map is not None:
-                s += " bump(\"{}\")".format(self._bump_map)
-            if self._projection_type is not None:
-                s += " proj_type({})".format(self._projection_type)
-            if self._projection_pos is not None:
-                s += " proj_pos({:.3f} {:.3f} {:.3f})"\
-                     .format(*self._projection_pos)
-            if self._projection_scale is not None:
-                s += " proj_scale({:.3f} {:.3f} {:.3f})"\
-                     .format(*self._projection_scale)
-            if self._projection_angle is not None:
-                s += " proj_pos({:.3f} {:.3f} {:.3f})"\
-                     .format(*self._projection_angle)
-            s += "\n"
-
-        return s
+        if fmt != 'MQO_FILE':
+            return ""
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+    def write(self, out):
+        """Write the line of the Material chunk to the text stream."""
+
+        out.write(INDENT + "\"{}\"".format(self._name))
+        if self._shader is not None:
+            out.write(" shader({})".format(self._shader))
+        if self._vertex_color is not None:
+            out.write(" vcol({})".format(self._vertex_color))
+        if self._doubles is not None:
+            out.write(" dbls({})".format(self._doubles))
+        if self._color is not None:
+            out.write(" col({:.3f} {:.3f} {:.3f} {:.3f})"
+                      .format(*self._color))
+        if self._diffuse is not None:
+            out.write(" dif({:.3f})".format(self._diffuse))
+        if self._ambient is not None:
+            out.write(" amb({:.3f})".format(self._ambient))
+        if self._emissive is not None:
+            out.write(" emi({:.3f})".format(self._emissive))
+        if self._specular is not None:
+            out.write(" spc({:.3f})".format(self.specular))
+        if self._power is not None:
+            out.write(" power({:.2f})".format(self._power))
+        if self._reflect is not None:
+            out.write(" reflect({:.3f})".format(self._reflect))
+        if self._refract is not None:
+            out.write(" refract({:.3f})".format(self._refract))
+        if self._texture_map is not None:
+            out.write(" tex(\"{}\")".format(self._texture_map))
+        if self._alpha_plane_map is not None:
+            out.write(" aplane(\"{}\")".format(self._alpha_plane_map))
+        if self._bump_map is not None:
+            out.write(" bump(\"{}\")".format(self._bump_map))
+        if self._projection_type is not None:
+            out.write(" proj_type({})".format(self._projection_type))
+        if self._projection_pos is not None:
+            out.write(" proj_pos({:.3f} {:.3f} {:.3f})"
+                      .format(*self._projection_pos))
+        if self._projection_scale is not None:
+            out.write(" proj_scale({:.3f} {:.3f} {:.3f})"
+                      .format(*self._projection_scale))
+        if self._projection_angle is not None:
+            out.write(" proj_pos({:.3f} {:.3f} {:.3f})"
+                      .format(*self._projection_angle))
+        out.write("\n")
 
     def set_default_params(self):
         self._name = "mat1"
@@ -630,6 +1063,12 @@ class Material:
 
 
 class Face:
+    __slots__ = ("_ngons", "_vertex_indices", "_material", "_uv_coords",
+                 "_normals", "_colors", "_crs")
+
+    ATTRIBUTES = ("ngons", "vertex_indices", "material", "uv_coords",
+                  "normals", "colors", "crs")
+
     def __init__(self):
         self._ngons = None
         self._vertex_indices = None
@@ -712,18 +1151,10 @@ class Face:
     # pylint: disable=W0102
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR,
                 ignore_keys=set()):
-        self_keys = list(self.__dict__.keys())
-        other_keys = list(other.__dict__.keys())
-
-        if len(self_keys) != len(other_keys):
-            return False
-
-        for key in self_keys:
-            if key in ignore_keys:
+        for key in Face.ATTRIBUTES:
+            if key in ignore_keys or "_" + key in ignore_keys:
                 continue
-            if key not in other_keys:
-                return False
-            if not is_same(self.__dict__[key], other.__dict__[key],
+            if not is_same(getattr(self, key), getattr(other, key),
                            allowable_error):
                 return False
 
@@ -732,35 +1163,355 @@ class Face:
     def to_str(self, fmt='STDOUT'):
         s = ""
         if fmt == 'MQO_FILE':
-            s += INDENT * 2 + "{}".format(self._ngons)
-            if self._vertex_indices is not None:
-                vert_indices_str = [str(idx)
-                                    for idx in self._vertex_indices]
+            # Properties are used so that FaceView is also serialized.
+            s += INDENT * 2 + "{}".format(self.ngons)
+            vertex_indices = self.vertex_indices
+            if vertex_indices is not None:
+                vert_indices_str = [str(idx) for idx in vertex_indices]
                 s += " V({})".format(" ".join(vert_indices_str))
-            if self._material is not None:
-                s += " M({})".format(self._material)
-            if self._uv_coords is not None:
-                coords = [x for uv in self._uv_coords for x in uv]
+            material = self.material
+            if material is not None:
+                s += " M({})".format(material)
+            uv_coords = self.uv_coords
+            if uv_coords is not None:
+                coords = [x for uv in uv_coords for x in uv]
                 coords_str = ["{:.5f}".format(c) for c in coords]
                 s += " UV({})".format(" ".join(coords_str))
-            if self._normals is not None:
-                normals = [x for normal in self._normals for x in normal]
-                normals_str = ["{:.6f}".format(n) for n in normals]
-                s += " N({}{})".format("2 " * len(self._normals),
+            normals = self.normals
+            if normals is not None:
+                normals_flat = [x for normal in normals for x in normal]
+                normals_str = ["{:.6f}".format(n) for n in normals_flat]
+                s += " N({}{})".format("2 " * len(normals),
                                        " ".join(normals_str))
-            if self._colors is not None:
-                colors = ["{}".format(c) for c in self._colors]
-                s += " COL({})".format(" ".join(colors))
-            if self._crs is not None:
-                crs = ["{}".format(c) for c in self._crs]
-                s += " CRS({})".format(" ".join(crs))
+            colors = self.colors
+            if colors is not None:
+                colors_str = ["{}".format(c) for c in colors]
+                s += " COL({})".format(" ".join(colors_str))
+            crs = self.crs
+            if crs is not None:
+                crs_str = ["{}".format(c) for c in crs]
+                s += " CRS({})".format(" ".join(crs_str))
             s += "\n"
 
         return s
 
 
+def zeros(typecode, length):
+    return array.array(typecode, [0]) * length
+
+
+class FaceBuffer:
+    """Columnar (structure of arrays) storage of faces.
+
+    The loops (face corners) of the face f are stored in the range
+    [loop_starts[f], loop_starts[f + 1]) of the per loop arrays. The per
+    loop arrays other than vertex_indices are allocated when the first face
+    which has the attribute is added. Whether a face has an attribute is
+    recorded in flags.
+    """
+
+    HAS_VERTEX_INDICES = 0x01
+    HAS_MATERIAL = 0x02
+    HAS_UV_COORDS = 0x04
+    HAS_NORMALS = 0x08
+    HAS_COLORS = 0x10
+    HAS_CRS = 0x20
+
+    # attribute: (flag, typecode, number of elements per loop)
+    LOOP_ATTRIBUTES = {
+        "uv_coords": (HAS_UV_COORDS, 'd', 2),
+        "normals": (HAS_NORMALS, 'd', 3),
+        "colors": (HAS_COLORS, 'q', 1),
+        "crs": (HAS_CRS, 'd', 1),
+    }
+
+    def __init__(self):
+        # Per face.
+        self.ngons = array.array('i')
+        self.loop_starts = array.array('i', [0])
+        self.flags = bytearray()
+        self.materials = array.array('i')
+
+        # Per loop.
+        self.vertex_indices = array.array('i')
+        self.uv_coords = None
+        self.normals = None
+        self.colors = None
+        self.crs = None
+
+        # Incremented when faces are added or vertex indices are changed.
+        self.revision = 0
+
+    def __len__(self):
+        return len(self.ngons)
+
+    def num_loops(self):
+        return self.loop_starts[-1]
+
+    def _loop_column(self, attr):
+        column = getattr(self, attr)
+        if column is None:
+            _, typecode, width = FaceBuffer.LOOP_ATTRIBUTES[attr]
+            column = zeros(typecode, self.num_loops() * width)
+            setattr(self, attr, column)
+        return column
+
+    # pylint: disable=too-many-arguments
+    def append(self, ngons, *, vertex_indices=None, material=None,
+               uv_coords=None, normals=None, colors=None, crs=None):
+        """Add a face. Per loop attributes are given as flat sequences."""
+
+        flags = 0
+        if vertex_indices is not None:
+            self.vertex_indices.extend(vertex_indices[:ngons])
+            flags |= FaceBuffer.HAS_VERTEX_INDICES
+        else:
+            self.vertex_indices.extend(zeros('i', ngons))
+
+        if material is not None:
+            self.materials.append(material)
+            flags |= FaceBuffer.HAS_MATERIAL
+        else:
+            self.materials.append(0)
+
+        for attr, values in (("uv_coords", uv_coords), ("normals", normals),
+                             ("colors", colors), ("crs", crs)):
+            flag, typecode, width = FaceBuffer.LOOP_ATTRIBUTES[attr]
+            if values is None:
+                column = getattr(self, attr)
+                if column is not None:
+                    column.extend(zeros(typecode, ngons * width))
+                continue
+            self._loop_column(attr).extend(values[:ngons * width])
+            flags |= flag
+
+        self.ngons.append(ngons)
+        self.loop_starts.append(self.loop_starts[-1] + ngons)
+        self.flags.append(flags)
+        self.revision += 1
+
+    def append_face(self, face):
+        def flatten(vectors):
+            if vectors is None:
+                return None
+            return [x for v in vectors for x in v]
+
+        self.append(face.ngons, vertex_indices=face.vertex_indices,
+                    material=face.material,
+                    uv_coords=flatten(face.uv_coords),
+                    normals=flatten(face.normals), colors=face.colors,
+                    crs=face.crs)
+
+    def extend(self, other):
+        self.revision += 1
+        num_loops = self.num_loops()
+        self.ngons.extend(other.ngons)
+        self.loop_starts.extend(
+            array.array('i', (s + num_loops for s in other.loop_starts[1:])))
+        self.flags.extend(other.flags)
+        self.materials.extend(other.materials)
+        self.vertex_indices.extend(other.vertex_indices)
+        for attr, (_, typecode, width) in FaceBuffer.LOOP_ATTRIBUTES.items():
+            values = getattr(other, attr)
+            if values is not None:
+                self._loop_column(attr).extend(values)
+            elif getattr(self, attr) is not None:
+                getattr(self, attr).extend(
+                    zeros(typecode, other.num_loops() * width))
+
+    def get_loop_attribute(self, attr, index):
+        flag, _, width = FaceBuffer.LOOP_ATTRIBUTES[attr]
+        if not self.flags[index] & flag:
+            return None
+        values = getattr(self, attr)[self.loop_starts[index] * width:
+                                     self.loop_starts[index + 1] * width]
+        if width == 1:
+            return values.tolist()
+        return [values[i:i + width].tolist()
+                for i in range(0, len(values), width)]
+
+    def set_loop_attribute(self, attr, index, values):
+        flag, typecode, width = FaceBuffer.LOOP_ATTRIBUTES[attr]
+        if values is None:
+            self.flags[index] &= ~flag
+            return
+        if width != 1:
+            values = [x for v in values for x in v]
+        if len(values) != self.ngons[index] * width:
+            raise RuntimeError("Number of {} does not match "
+                               "(expects {}, but {})"
+                               .format(attr, self.ngons[index],
+                                       len(values) // width))
+        column = self._loop_column(attr)
+        column[self.loop_starts[index] * width:
+               self.loop_starts[index + 1] * width] = \
+            array.array(typecode, values)
+        self.flags[index] |= flag
+
+    def format_lines(self, start, end):
+        """Format the faces [start, end) as the lines of 'face' chunk.
+
+        All lines are formatted by one %-format operation instead of
+        formatting each number.
+        """
+
+        templates = {}
+        lines = []
+        values = []
+        loop_starts = self.loop_starts
+        # Same order as the fields of the face line.
+        columns = []
+        for attr in ("uv_coords", "normals", "colors", "crs"):
+            flag, _, width = FaceBuffer.LOOP_ATTRIBUTES[attr]
+            columns.append((flag, getattr(self, attr), width))
+        for i in range(start, end):
+            ngons = self.ngons[i]
+            flags = self.flags[i]
+            key = (ngons, flags)
+            if key not in templates:
+                templates[key] = face_line_template(ngons, flags)
+            lines.append(templates[key])
+
+            ls = loop_starts[i]
+            le = loop_starts[i + 1]
+            values.append(ngons)
+            if flags & FaceBuffer.HAS_VERTEX_INDICES:
+                values.extend(self.vertex_indices[ls:le])
+            if flags & FaceBuffer.HAS_MATERIAL:
+                values.append(self.materials[i])
+            for flag, column, width in columns:
+                if flags & flag:
+                    values.extend(column[ls * width:le * width])
+
+        return "".join(lines) % tuple(values)
+
+
+def face_line_template(ngons, flags):
+    """Return %-format template of the face line which has the attributes
+    indicated by flags. This matches the output of Face.to_str."""
+
+    s = INDENT * 2 + "%d"
+    if flags & FaceBuffer.HAS_VERTEX_INDICES:
+        s += " V(" + " ".join(["%d"] * ngons) + ")"
+    if flags & FaceBuffer.HAS_MATERIAL:
+        s += " M(%d)"
+    if flags & FaceBuffer.HAS_UV_COORDS:
+        s += " UV(" + " ".join(["%.5f"] * (ngons * 2)) + ")"
+    if flags & FaceBuffer.HAS_NORMALS:
+        s += " N(" + "2 " * ngons + " ".join(["%.6f"] * (ngons * 3)) + ")"
+    if flags & FaceBuffer.HAS_COLORS:
+        s += " COL(" + " ".join(["%s"] * ngons) + ")"
+    if flags & FaceBuffer.HAS_CRS:
+        s += " CRS(" + " ".join(["%s"] * ngons) + ")"
+    return s + "\n"
+
+
+def format_vector_block(buffer, line_template, start, end):
+    """Format the vectors [start, end) of the flat buffer at once. Each
+    vector is formatted by line_template which has %-format fields as many
+    as the elements of the vector."""
+
+    width = line_template.count("%")
+    return (line_template * (end - start)) % \
+        tuple(buffer[start * width:end * width])
+
+
+class FaceView(Face):
+    """Face which refers the index-th face of FaceBuffer.
+
+    Modifications are written back to the buffer. The number of vertices
+    can not be changed.
+    """
+
+    __slots__ = ("_buffer", "_index")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, buffer, index):
+        self._buffer = buffer
+        self._index = index
+
+    @property
+    def ngons(self):
+        return self._buffer.ngons[self._index]
+
+    @ngons.setter
+    def ngons(self, ngons_):
+        if ngons_ != self.ngons:
+            raise RuntimeError("Number of vertices can not be changed.")
+
+    @property
+    def vertex_indices(self):
+        buf = self._buffer
+        if not buf.flags[self._index] & FaceBuffer.HAS_VERTEX_INDICES:
+            return None
+        return buf.vertex_indices[buf.loop_starts[self._index]:
+                                  buf.loop_starts[self._index + 1]].tolist()
+
+    @vertex_indices.setter
+    def vertex_indices(self, vertex_indices_):
+        buf = self._buffer
+        buf.revision += 1
+        if vertex_indices_ is None:
+            buf.flags[self._index] &= ~FaceBuffer.HAS_VERTEX_INDICES
+            return
+        if len(vertex_indices_) != self.ngons:
+            raise RuntimeError("Number of vertices can not be changed.")
+        buf.vertex_indices[buf.loop_starts[self._index]:
+                           buf.loop_starts[self._index + 1]] = \
+            array.array('i', vertex_indices_)
+        buf.flags[self._index] |= FaceBuffer.HAS_VERTEX_INDICES
+
+    @property
+    def material(self):
+        if not self._buffer.flags[self._index] & FaceBuffer.HAS_MATERIAL:
+            return None
+        return self._buffer.materials[self._index]
+
+    @material.setter
+    def material(self, material_):
+        if material_ is None:
+            self._buffer.flags[self._index] &= ~FaceBuffer.HAS_MATERIAL
+            return
+        self._buffer.materials[self._index] = material_
+        self._buffer.flags[self._index] |= FaceBuffer.HAS_MATERIAL
+
+    @property
+    def uv_coords(self):
+        return self._buffer.get_loop_attribute("uv_coords", self._index)
+
+    @uv_coords.setter
+    def uv_coords(self, uv_coords_):
+        self._buffer.set_loop_attribute("uv_coords", self._index, uv_coords_)
+
+    @property
+    def normals(self):
+        return self._buffer.get_loop_attribute("normals", self._index)
+
+    @normals.setter
+    def normals(self, normals_):
+        self._buffer.set_loop_attribute("normals", self._index, normals_)
+
+    @property
+    def colors(self):
+        return self._buffer.get_loop_attribute("colors", self._index)
+
+    @colors.setter
+    def colors(self, colors_):
+        self._buffer.set_loop_attribute("colors", self._index, colors_)
+
+    @property
+    def crs(self):
+        return self._buffer.get_loop_attribute("crs", self._index)
+
+    @crs.setter
+    def crs(self, crs_):
+        self._buffer.set_loop_attribute("crs", self._index, crs_)
+
+
 class Object:
     class VertexAttr:
+        __slots__ = ("uid", "weit", "color")
+
         def __init__(self):
             self.uid = None    # Not supported.
             self.weit = {}     # { vertex_index: weit }
@@ -771,17 +1522,21 @@ class Object:
                 self.weit[vidx] = w
 
         def to_str(self, fmt='STDOUT'):
-            s = ""
-            if fmt == 'MQO_FILE':
-                s += INDENT * 2 + "weit {"
-                s += "\n"
-                for vidx in sorted(self.weit.keys()):
-                    s += INDENT * 3 + "{} {:.3f}".format(vidx, self.weit[vidx])
-                    s += "\n"
-                s += INDENT * 2 + "}"
-                s += "\n"
-
-            return s
+            if fmt != 'MQO_FILE':
+                return ""
+            out = io.StringIO()
+            self.write(out)
+            return out.getvalue()
+
+        def write(self, out):
+            out.write(INDENT * 2 + "weit {\n")
+            line_template = INDENT * 3 + "%s %.3f\n"
+            items = [x for item in sorted(self.weit.items()) for x in item]
+            for start in range(0, len(items) // 2, WRITE_BATCH_LINES):
+                end = min(start + WRITE_BATCH_LINES, len(items) // 2)
+                out.write(format_vector_block(items, line_template,
+                                              start, end))
+            out.write(INDENT * 2 + "}\n")
 
         def is_same(self, other):
             if len(self.weit.keys()) != len(other.weit.keys()):
@@ -817,8 +1572,9 @@ class Object:
         self._lathe_axis = None
         self._lathe_segment = None
         self._normal_weight = None
-        self._vertices = []
-        self._faces = []
+        self._vertices = array.array('d')     # [x0, y0, z0, x1, ...]
+        self._faces = FaceBuffer()
+        self._uniq_faces = None     # (buffer, revision, face indices)
         self._vertex_attrs = None
 
     @property
@@ -1052,13 +1808,26 @@ class Object:
         self._normal_weight = normal_weight_
 
     def add_vertex(self, vertex):
-        self._vertices.append(vertex)
+        self._vertices.extend(vertex)
 
     def add_vertices(self, vertices):
+        if isinstance(vertices, array.array):
+            # Flat buffer is stored as it is.
+            if len(self._vertices) == 0:
+                self._vertices = vertices
+                return
+            if self._vertices.typecode != vertices.typecode:
+                self._vertices = array.array('d', self._vertices)
+                vertices = array.array('d', vertices)
+            self._vertices.extend(vertices)
+            return
         for v in vertices:
-            self._vertices.append(v)
+            self._vertices.extend(v)
 
     def get_vertices(self):
+        return FlatVectorView(self._vertices, 3)
+
+    def get_vertex_buffer(self):
         return self._vertices
 
     def merge_vertexattr(self, attrs):
@@ -1077,26 +1846,66 @@ class Object:
         return None
 
     def add_face(self, face):
-        self._faces.append(face)
+        self._faces.append_face(face)
 
     def add_faces(self, faces):
+        if isinstance(faces, FaceBuffer):
+            if len(self._faces) == 0:
+                self._faces = faces
+            else:
+                self._faces.extend(faces)
+            return
         for f in faces:
-            self._faces.append(f)
+            self._faces.append_face(f)
 
     def get_faces(self, uniq=False):
+        """Return the faces as FaceView which refers the face buffer.
+
+        Modifications to the returned faces are reflected to this object.
+        """
+
+        buffer = self._faces
+        return [FaceView(buffer, i) for i in self.get_face_indices(uniq)]
+
+    def get_face_indices(self, uniq=False):
+        """Return the indices in the face buffer of the faces which
+        get_faces() returns."""
+
+        buffer = self._faces
         if uniq is False:
-            return [face for face in self._faces if face.ngons > 2]
+            indices = range(len(buffer))
+        else:
+            indices = self._get_uniq_face_indices()
+        ngons = buffer.ngons
+        return [i for i in indices if ngons[i] > 2]
+
+    def _get_uniq_face_indices(self):
+        """Return the indices of the faces whose set of vertex indices
+        does not appear in the preceding faces."""
+
+        buffer = self._faces
+        cache = self._uniq_faces
+        if cache is not None and cache[0] is buffer and \
+                cache[1] == buffer.revision:
+            return cache[2]
+
+        vertex_indices = buffer.vertex_indices.tolist()
+        loop_starts = buffer.loop_starts.tolist()
+        seen = set()
+        uniq_indices = []
+        for i in range(len(buffer)):
+            key = frozenset(
+                vertex_indices[loop_starts[i]:loop_starts[i + 1]])
+            if key in seen:
+                continue
+            seen.add(key)
+            uniq_indices.append(i)
 
-        faces = []
-        for f1 in self._faces:
-            f1_vertex_indices = set(f1.vertex_indices)
-            for f2 in faces:
-                if f1_vertex_indices == set(f2.vertex_indices):
-                    break
-            else:
-                faces.append(f1)
+        self._uniq_faces = (buffer, buffer.revision, uniq_indices)
+        return uniq_indices
 
-        return [f for f in faces if f.ngons > 2]
+    def get_face_buffer(self):
+        return self._faces
 
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR):
         self_keys = list(self.__dict__.keys())
@@ -1117,11 +1926,11 @@ class Object:
                            allowable_error):
                 return False
 
-        for sv, ov in zip(self._vertices, other.vertices):
+        for sv, ov in zip(self.get_vertices(), other.get_vertices()):
             if not is_same(sv, ov):
                 return False
 
-        for sf, of in zip(self._faces, other.faces):
+        for sf, of in zip(self.get_faces(), other.get_faces()):
             if not sf.is_same(of):
                 return False
 
@@ -1132,77 +1941,120 @@ class Object:
         return True
 
     def to_str(self, fmt='STDOUT'):
-        s = ""
-
-        if fmt == 'MQO_FILE':
-            s += "Object \"{}\"".format(self._name) + " {\n"
-            if self._uid is not None:
-                s += INDENT + "uid {}\n".format(self._uid)
-            if self._depth is not None:
-                s += INDENT + "depth {}\n".format(self._depth)
-            if self._folding is not None:
-                s += INDENT + "folding {}\n".format(self._folding)
-            if self._scale is not None:
-                s += INDENT
-                s += "scale {:.6f} {:.6f} {:.6f}\n".format(*self._scale)
-            if self._rotation is not None:
-                s += INDENT
-                s += "rotation {:.6f} {:.6f} {:.6f}\n".format(*self._rotation)
-            if self._translation is not None:
-                s += INDENT
-                s += "translation {:.6f} {:.6f} {:.6f}\n".format(
-                    *self._translation)
-            if self._patch is not None:
-                s += INDENT + "patch {}\n".format(self._patch)
-            if self._patch_triangle is not None:
-                s += INDENT + "patchtri {}\n".format(self._patch_triangle)
-            if self._segment is not None:
-                s += INDENT + "segment {}\n".format(self._segment)
-            if self._visible is not None:
-                s += INDENT + "visible {}\n".format(self._visible)
-            if self._locking is not None:
-                s += INDENT + "locking {}\n".format(self._locking)
-            if self._shading is not None:
-                s += INDENT + "shading {}\n".format(self._shading)
-            if self._facet is not None:
-                s += INDENT + "facet {:.1f}\n".format(self._facet)
-            if self._color is not None:
-                s += INDENT
-                s += "color {:.3f} {:.3f} {:.3f}\n".format(*self._color)
-            if self._color_type is not None:
-                s += INDENT + "color_type {}\n".format(self._color_type)
-            if self._mirror is not None:
-                s += INDENT + "mirror {}\n".format(self._mirror)
-            if self._mirror_axis is not None:
-                s += INDENT + "mirror_axis {}\n".format(self._mirror_axis)
-            if self._mirror_distance is not None:
-                s += INDENT
-                s += "mirror_dis {:.3f}\n".format(self._mirror_distance)
-            if self._lathe is not None:
-                s += INDENT + "lathe {}\n".format(self._lathe)
-            if self._lathe_axis is not None:
-                s += INDENT + "lathe_axis {}\n".format(self._lathe_axis)
-            if self._lathe_segment is not None:
-                s += INDENT + "lathe_seg {}\n".format(self._lathe_segment)
-            if self._normal_weight is not None:
-                s += INDENT + "normal_weight {}\n".format(self._normal_weight)
-            if len(self._vertices) > 0:
-                s += INDENT + "vertex {}".format(len(self._vertices)) + " {\n"
-                for vert in self._vertices:
-                    s += INDENT * 2 + "{:.4f} {:.4f} {:.4f}\n".format(*vert)
-                s += INDENT + "}\n"
-            if len(self._faces) > 0:
-                s += INDENT + "face {}".format(len(self._faces)) + " {\n"
-                for face in self._faces:
-                    s += face.to_str(fmt)
-                s += INDENT + "}\n"
-            if self._vertex_attrs is not None:
-                s += INDENT + "vertexattr {\n"
-                s += self._vertex_attrs.to_str(fmt)
-                s += INDENT + "}\n"
-            s += "}\n"
-
-        return s
+        if fmt != 'MQO_FILE':
+            return ""
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
+
+    def _write_header(self, out):
+        out.write("Object \"{}\"".format(self._name) + " {\n")
+        if self._uid is not None:
+            out.write(INDENT + "uid {}\n".format(self._uid))
+        if self._depth is not None:
+            out.write(INDENT + "depth {}\n".format(self._depth))
+        if self._folding is not None:
+            out.write(INDENT + "folding {}\n".format(self._folding))
+        if self._scale is not None:
+            out.write(INDENT + "scale {:.6f} {:.6f} {:.6f}\n"
+                      .format(*self._scale))
+        if self._rotation is not None:
+            out.write(INDENT + "rotation {:.6f} {:.6f} {:.6f}\n"
+                      .format(*self._rotation))
+        if self._translation is not None:
+            out.write(INDENT + "translation {:.6f} {:.6f} {:.6f}\n"
+                      .format(*self._translation))
+        if self._patch is not None:
+            out.write(INDENT + "patch {}\n".format(self._patch))
+        if self._patch_triangle is not None:
+            out.write(INDENT + "patchtri {}\n".format(self._patch_triangle))
+        if self._segment is not None:
+            out.write(INDENT + "segment {}\n".format(self._segment))
+        if self._visible is not None:
+            out.write(INDENT + "visible {}\n".format(self._visible))
+        if self._locking is not None:
+            out.write(INDENT + "locking {}\n".format(self._locking))
+        if self._shading is not None:
+            out.write(INDENT + "shading {}\n".format(self._shading))
+        if self._facet is not None:
+            out.write(INDENT + "facet {:.1f}\n".format(self._facet))
+        if self._color is not None:
+            out.write(INDENT + "color {:.3f} {:.3f} {:.3f}\n"
+                      .format(*self._color))
+        if self._color_type is not None:
+            out.write(INDENT + "color_type {}\n".format(self._color_type))
+        if self._mirror is not None:
+            out.write(INDENT + "mirror {}\n".format(self._mirror))
+        if self._mirror_axis is not None:
+            out.write(INDENT + "mirror_axis {}\n".format(self._mirror_axis))
+        if self._mirror_distance is not None:
+            out.write(INDENT + "mirror_dis {:.3f}\n"
+                      .format(self._mirror_distance))
+        if self._lathe is not None:
+            out.write(INDENT + "lathe {}\n".format(self._lathe))
+        if self._lathe_axis is not None:
+            out.write(INDENT + "lathe_axis {}\n".format(self._lathe_axis))
+        if self._lathe_segment is not None:
+            out.write(INDENT + "lathe_seg {}\n".format(self._lathe_segment))
+        if self._normal_weight is not None:
+            out.write(INDENT + "normal_weight {}\n"
+                      .format(self._normal_weight))
+
+    def write(self, out, binary_vertex=False):
+        """Write the Object chunk to the text stream.
+
+        If binary_vertex is True and out has the underlying binary buffer,
+        vertices are written as 'BVertex' chunk.
+        """
+
+        self._write_header(out)
+
+        num_verts = len(self._vertices) // 3
+        if num_verts > 0 and binary_vertex and hasattr(out, "buffer"):
+            self._write_bvertex(out, num_verts)
+        elif num_verts > 0:
+            line_template = INDENT * 2 + "%.4f %.4f %.4f\n"
+            out.write(INDENT + "vertex {}".format(num_verts) + " {\n")
+            for start in range(0, num_verts, WRITE_BATCH_LINES):
+                end = min(start + WRITE_BATCH_LINES, num_verts)
+                out.write(format_vector_block(self._vertices, line_template,
+                                              start, end))
+            out.write(INDENT + "}\n")
+
+        faces = self._faces
+        if len(faces) > 0:
+            out.write(INDENT + "face {}".format(len(faces)) + " {\n")
+            for start in range(0, len(faces), WRITE_BATCH_LINES):
+                end = min(start + WRITE_BATCH_LINES, len(faces))
+                out.write(faces.format_lines(start, end))
+            out.write(INDENT + "}\n")
+
+        if self._vertex_attrs is not None:
+            out.write(INDENT + "vertexattr {\n")
+            self._vertex_attrs.write(out)
+            out.write(INDENT + "}\n")
+        out.write("}\n")
+
+    def _write_bvertex(self, out, num_verts):
+        # Payload is little-endian float32.
+        if numpy is not None:
+            payload = numpy.frombuffer(
+                self._vertices, dtype=self._vertices.typecode).astype("<f4")
+        else:
+            payload = self._vertices
+            if payload.typecode != 'f':
+                payload = array.array('f', payload)
+            if sys.byteorder != "little":
+                payload = array.array('f', payload)
+                payload.byteswap()
+
+        out.write(INDENT + "BVertex {}".format(num_verts) + " {\n")
+        out.write(INDENT * 2 + "Vector {} [{}]\n"
+                  .format(num_verts, num_verts * 3 * 4))
+        # Text written so far must precede the payload.
+        out.flush()
+        out.buffer.write(memoryview(payload).cast("B"))
+        out.write("\n" + INDENT + "}\n")
 
     def set_default_params(self):
         self._name = "obj1"
@@ -1228,14 +2080,86 @@ class Object:
         self._lathe_axis = None
         self._lathe_segment = None
         self._normal_weight = 1
-        self._vertices = []
-        self._faces = []
+        self._vertices = array.array('d')
+        self._faces = FaceBuffer()
+        self._uniq_faces = None     # (buffer, revision, face indices)
         self._vertex_attrs = None
 
 
+class ChunkInfo:
+    """Location of a chunk in the document and its header fields which are
+    read by the pre-scan of the lazy loading."""
+
+    __slots__ = ("kind", "offset", "length", "name", "depth", "num_vertices",
+                 "num_faces")
+
+    def __init__(self, kind, offset):
+        self.kind = kind        # "Scene", "Material" or "Object"
+        self.offset = offset
+        self.length = 0
+
+        # Only for "Object".
+        self.name = None
+        self.depth = 0
+        self.num_vertices = 0
+        self.num_faces = 0
+
+
+class LazyObject(Object):
+    """Object whose chunk is parsed on the first access to the fields other
+    than the name and the depth."""
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, mqo_file, chunk):
+        self._mqo_file = mqo_file
+        self._chunk = chunk
+        self._name = chunk.name
+        self._depth = chunk.depth
+
+    def __getattr__(self, name):
+        # Called only when the attribute is not found, which means the
+        # chunk is not parsed yet.
+        if name in ("_mqo_file", "_chunk") or self._mqo_file is None:
+            raise AttributeError(name)
+        self.load()
+        return getattr(self, name)
+
+    def get_chunk_info(self):
+        return self._chunk
+
+    def is_loaded(self):
+        return self._mqo_file is None
+
+    def load(self):
+        if self._mqo_file is None:
+            return
+        # pylint: disable=protected-access
+        obj = self._mqo_file._load_object(self._chunk)
+        self._mqo_file = None
+        # Fields which are set before loading take precedence.
+        for key, value in obj.__dict__.items():
+            self.__dict__.setdefault(key, value)
+
+
+def parse_object_chunk(filepath, file_size, chunk, encoding=None,
+                       use_mmap=True):
+    """Parse the Object chunk of the .mqo file. This is called in the worker
+    processes of the parallel loading, so the arguments and the returned
+    Object must be picklable."""
+
+    # pylint: disable=protected-access
+    mqo_file = MqoFile()
+    mqo_file._filepath = filepath
+    mqo_file._file_size = file_size
+    mqo_file._use_mmap = use_mmap
+    mqo_file._encoding = encoding
+    return mqo_file._load_object(chunk)
+
+
 class MqoFile:
     def __init__(self):
         self._raw = None
+        self._encoding = None   # Detected from the first non-ASCII string.
 
         # .mqo data structure
         self._header = None
@@ -1245,6 +2169,13 @@ class MqoFile:
         self._materials = []
         self._objects = []
 
+        # Lazy loading.
+        self._filepath = None
+        self._file_size = None
+        self._use_mmap = True
+        self._lazy = False
+        self._chunks = []
+
     def __repr__(self):
         s = "Header: {}\n".format(self._header)
         s += "Version: {}\n".format(self._version)
@@ -1312,6 +2243,9 @@ class MqoFile:
     def add_object(self, object_):
         self._objects.append(object_)
 
+    def get_chunk_index(self):
+        return self._chunks
+
     # pylint: disable=too-many-return-statements
     def is_same(self, other, allowable_error=ALLOWABLE_ERROR):
         self_keys = list(self.__dict__.keys())
@@ -1372,9 +2306,10 @@ class MqoFile:
         if first_line.find(b"light {") == -1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
+        fields = LIGHT_FIELD_RGX
+
         def parse(line, rgx):
-            r = re.compile(rgx)
-            m = r.search(line)
+            m = rgx.search(line)
             if not m:
                 raise RuntimeError("Failed to parse. (line:{})".format(line))
             return m.groups()
@@ -1389,17 +2324,16 @@ class MqoFile:
                 return light
 
             if line.find(b"dir") != -1:
-                rgx = rb"dir ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"
+                rgx = fields[b"dir"]
                 light.dir = [float(s) for s in parse(line, rgx)]
             elif line.find(b"color") != -1:
-                rgx = rb"color ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"
+                rgx = fields[b"color"]
                 light.color = [float(s) for s in parse(line, rgx)]
 
         raise RuntimeError("Format Error: Failed to parse 'light' field")
 
     def _parse_dirlights(self, first_line):
-        r = re.compile(rb"dirlights ([0-9]+) {")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"dirlights"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
         num_light = int(m.group(1))
@@ -1426,9 +2360,10 @@ class MqoFile:
         if first_line.find(b"Scene {") == -1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
+        fields = SCENE_FIELD_RGX
+
         def parse(line, rgx):
-            r = re.compile(rgx)
-            m = r.search(line)
+            m = rgx.search(line)
             if not m:
                 raise RuntimeError("Failed to parse. (line:{})".format(line))
             return m.groups()
@@ -1443,50 +2378,51 @@ class MqoFile:
                 return scene
 
             if line.find(b"pos") != -1:
-                rgx = rb"pos ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"
+                rgx = fields[b"pos"]
                 scene.pos = [float(s) for s in parse(line, rgx)]
             elif line.find(b"lookat") != -1:
-                rgx = rb"lookat ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"
+                rgx = fields[b"lookat"]
                 scene.lookat = [float(s) for s in parse(line, rgx)]
             elif line.find(b"head") != -1:
-                rgx = rb"head ([-0-9\.]+)"
+                rgx = fields[b"head"]
                 scene.head = float(parse(line, rgx)[0])
             elif line.find(b"pich") != -1:
-                rgx = rb"pich ([-0-9\.]+)"
+                rgx = fields[b"pich"]
                 scene.pich = float(parse(line, rgx)[0])
             elif line.find(b"bank") != -1:
-                rgx = rb"bank ([-0-9\.]+)"
+                rgx = fields[b"bank"]
                 scene.bank = float(parse(line, rgx)[0])
             elif line.find(b"ortho") != -1:
-                rgx = rb"ortho ([0-9\.]+)"
+                rgx = fields[b"ortho"]
                 scene.ortho = float(parse(line, rgx)[0])
             elif line.find(b"zoom2") != -1:
-                rgx = rb"zoom2 ([0-9\.]+)"
+                rgx = fields[b"zoom2"]
                 scene.zoom2 = float(parse(line, rgx)[0])
             elif line.find(b"amb") != -1:
-                rgx = rb"amb ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"
+                rgx = fields[b"amb"]
                 scene.amb = [float(s) for s in parse(line, rgx)]
             elif line.find(b"frontclip") != -1:
-                rgx = rb"frontclip ([0-9\.]+)"
+                rgx = fields[b"frontclip"]
                 scene.frontclip = float(parse(line, rgx)[0])
             elif line.find(b"backclip") != -1:
-                rgx = rb"backclip ([0-9\.]+)"
+                rgx = fields[b"backclip"]
                 scene.backclip = float(parse(line, rgx)[0])
             elif line.find(b"dirlights") != -1:
-                scene.add_dirlight(self._parse_dirlights(line))
+                for light in self._parse_dirlights(line):
+                    scene.add_dirlight(light)
 
         raise RuntimeError("Format Error: Failed to parse 'Scene' field.")
 
     def _parse_material(self, first_line):
-        r = re.compile(rb"Material ([0-9]+) {")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"Material"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
         num_mtrl = int(m.group(1))
 
+        fields = MATERIAL_FIELD_RGX
+
         def parse(line, rgx):
-            r = re.compile(rgx)
-            m = r.search(line)
+            m = rgx.search(line)
             if not m:
                 return None
             return m.groups()
@@ -1506,73 +2442,64 @@ class MqoFile:
 
             mtrl = Material()
 
-            pattern = rb"\"([^\"]*)\""
-            r = re.compile(pattern)
-            m = r.search(line)
+            m = fields[b"name"].search(line)
             if not m:
                 raise RuntimeError("Failed to find material name. (line:{})"
                                    .format(line))
-            mtrl.name = decode(m.group(1))
+            mtrl.name = self._decode(m.group(1))
 
-            result = parse(line, rb"\"[^\"]*\" .*shader\(([0-4])\)")
+            result = parse(line, fields[b"shader"])
             if result:
                 mtrl.shader = int(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*vcol\(([0-1])\)")
+            result = parse(line, fields[b"vcol"])
             if result:
                 mtrl.vertex_color = int(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*dbls\(([0-1])\)")
+            result = parse(line, fields[b"dbls"])
             if result:
                 mtrl.doubles = int(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*col\(([0-1]\.[0-9]+) "
-                                 rb"([0-1]\.[0-9]+) ([0-1]\.[0-9]+) "
-                                 rb"([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"col"])
             if result:
                 mtrl.color = [float(v) for v in result]
-            result = parse(line, rb"\"[^\"]*\" .*dif\(([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"dif"])
             if result:
                 mtrl.diffuse = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*amb\(([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"amb"])
             if result:
                 mtrl.ambient = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*emi\(([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"emi"])
             if result:
                 mtrl.emissive = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*spc\(([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"spc"])
             if result:
                 mtrl.specular = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*power\(([0-9]+\.[0-9]+)\)")
+            result = parse(line, fields[b"power"])
             if result:
                 mtrl.power = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*reflect\(([0-1]\.[0-9]+)\)")
+            result = parse(line, fields[b"reflect"])
             if result:
                 mtrl.reflect = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*refract\(([1-5]\.[0-9]+)\)")
+            result = parse(line, fields[b"refract"])
             if result:
                 mtrl.refract = float(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*tex\(\"([^\)]+)\"\)")
+            result = parse(line, fields[b"tex"])
             if result:
-                mtrl.texture_map = decode(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*aplane\(\"([^\)]+)\"\)")
+                mtrl.texture_map = self._decode(result[0])
+            result = parse(line, fields[b"aplane"])
             if result:
-                mtrl.alpha_plane_map = decode(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*bump\(\"([^\)]+)\"\)")
+                mtrl.alpha_plane_map = self._decode(result[0])
+            result = parse(line, fields[b"bump"])
             if result:
-                mtrl.bump_map = decode(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*proj_type\(([0-3])\)")
+                mtrl.bump_map = self._decode(result[0])
+            result = parse(line, fields[b"proj_type"])
             if result:
                 mtrl.projection_type = int(result[0])
-            result = parse(line, rb"\"[^\"]*\" .*proj_pos\((-?[0-9]+\.[0-9]+) "
-                                 rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)")
+            result = parse(line, fields[b"proj_pos"])
             if result:
                 mtrl.projection_pos = [float(v) for v in result]
-            result = parse(line, rb"\"[^\"]*\" "
-                                 rb".*proj_scale\((-?[0-9]+\.[0-9]+) "
-                                 rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)")
+            result = parse(line, fields[b"proj_scale"])
             if result:
                 mtrl.projection_scale = [float(v) for v in result]
-            result = parse(line, rb"\"[^\"]*\" "
-                                 rb".*proj_angle\((-?[0-9]+\.[0-9]+) "
-                                 rb"(-?[0-9]+\.[0-9]+) (-?[0-9]+\.[0-9]+)")
+            result = parse(line, fields[b"proj_angle"])
             if result:
                 mtrl.projection_angle = [float(v) for v in result]
 
@@ -1581,42 +2508,32 @@ class MqoFile:
         raise RuntimeError("Format Error: Failed to parse 'Material' field.")
 
     def _parse_vertex(self, first_line):
-        r = re.compile(rb"vertex ([0-9]+) {")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"vertex"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
         num_verts = int(m.group(1))
-        verts = []
-        while not self._raw.eof():
-            line = self._raw.get_line()
-            line = remove_return(line)
-            line = line.strip()
 
-            if line.find(b"}") != -1:
-                if num_verts != len(verts):
-                    raise RuntimeError("Number of Vertices does not match "
-                                       "(expects {}, but {})"
-                                       .format(num_verts, len(verts)))
-                return verts
+        # Vertex lines have no brace, so the whole block is converted at once.
+        block = self._raw.read_until(b"}")
+        if block is None:
+            raise RuntimeError("Format Error: Failed to parse 'vertex' field.")
+        self._raw.get_line()
 
-            r = re.compile(rb"([-0-9\.e]+) ([-0-9\.e]+) ([-0-9\.e]+)")
-            m = r.search(line)
-            if not m or len(m.groups()) != 3:
-                raise RuntimeError("Invalid format. (line:{})".format(line))
-
-            verts.append([float(elm) for elm in m.groups()])
-
-        raise RuntimeError("Format Error: Failed to parse 'vertex' field.")
+        verts = parse_float_block(block)
+        if num_verts * 3 != len(verts):
+            raise RuntimeError("Number of Vertices does not match "
+                               "(expects {}, but {})"
+                               .format(num_verts, len(verts) // 3))
+        return verts
 
     def _parse_bvertex(self, first_line):
-        r = re.compile(rb"BVertex ([0-9]+) {")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"BVertex"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
         num_verts = int(m.group(1))
-        verts = []
+        verts = None
         bracecount = 1
         while not self._raw.eof():
             line = self._raw.get_line()
@@ -1629,33 +2546,33 @@ class MqoFile:
             if line.find(b"}") != -1:
                 bracecount -= 1
                 if bracecount == 0:
-                    if num_verts != len(verts):
+                    num_read = 0 if verts is None else len(verts) // 3
+                    if num_verts != num_read:
                         raise RuntimeError("Number of Vertices does not match "
                                            "(expects {}, but {})"
-                                           .format(num_verts, len(verts)))
+                                           .format(num_verts, num_read))
                     return verts
-            if not verts:
-                for _ in range(num_verts):
-                    x, y, z = struct.unpack("<fff", self._raw.read(3 * 4))
-                    verts.append([x, y, z])
+            if verts is None:
+                # Little-endian float32 payload is kept as float32.
+                verts = self._raw.read_array('f', num_verts * 3)
+                if sys.byteorder != "little":
+                    verts.byteswap()
 
         raise RuntimeError("Format Error: Failed to parse 'BVertex' field.")
 
     def _parse_face(self, first_line):
-        r = re.compile(rb"face ([0-9]+)\s*{")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"face"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
-        def parse(line, rgx):
-            r = re.compile(rgx)
-            m = r.search(line)
-            if not m:
-                return None
-            return m.groups()
+        def check_count(name, ngons, values, width=1):
+            if ngons != len(values) // width:
+                raise RuntimeError("Number of {} does not match "
+                                   "(expects {}, but {}"
+                                   .format(name, ngons, len(values) // width))
 
         num_faces = int(m.group(1))
-        faces = []
+        faces = FaceBuffer()
         while not self._raw.eof():
             line = self._raw.get_line()
             line = remove_return(line)
@@ -1668,71 +2585,32 @@ class MqoFile:
                                        .format(num_faces, len(faces)))
                 return faces
 
-            pattern = rb"([0-9]+)"
-            r = re.compile(pattern)
-            m = r.search(line)
-            if not m:
-                raise RuntimeError("Failed to find material name. (line:{})"
-                                   .format(line))
-
-            face = Face()
-            face.ngons = int(m.group(1))
-
-            result = parse(line, rb"[0-9]+.* V\(([-0-9\. ]+)\)")
-            if result:
-                face.vertex_indices = [
-                    int(vidx) for vidx in decode(result[0]).split(" ")]
-                if face.ngons != len(face.vertex_indices):
-                    raise RuntimeError("Number of Vertices does not match "
-                                       "(expects {}, but {}"
-                                       .format(face.ngons,
-                                               len(face.vertex_indices)))
-
-            result = parse(line, rb"[0-9]+.* M\(([0-9 ]+)\)")
-            if result:
-                face.material = int(result[0])
-
-            result = parse(line, rb"[0-9]+.* UV\(([-0-9\. ]+)\)")
-            if result:
-                uvs = [float(c) for c in decode(result[0]).split(" ")]
-                face.uv_coords = [[u, v] for u, v in zip(uvs[::2], uvs[1::2])]
-                if face.ngons != len(face.uv_coords):
-                    raise RuntimeError("Number of UV Coords does not match "
-                                       "(expects {}, but {}"
-                                       .format(face.ngons,
-                                               len(face.uv_coords)))
-
-            result = parse(line, rb"[0-9]+.* N\(([-0-9\. ]+)\)")
-            if result:
-                normals_str_raw = list(decode(result[0]).split(" "))
-                _ = normals_str_raw[:len(normals_str_raw) // 4]
-                normals = normals_str_raw[len(normals_str_raw) // 4:]
-                face.normals = [[float(x), float(y), float(z)]
-                                for x, y, z in zip(normals[::3], normals[1::3],
-                                                   normals[2::3])]
-                if face.ngons != len(face.normals):
-                    raise RuntimeError("Number of Normals does not match "
-                                       "(expects {}, but {}"
-                                       .format(face.ngons,
-                                               len(face.normals)))
-
-            result = parse(line, rb"[0-9]+.* COL\(([0-9 ]+)\)")
-            if result:
-                face.colors = [int(c) for c in decode(result[0]).split(" ")]
-                if face.ngons != len(face.colors):
-                    raise RuntimeError("Number of Colors does not match "
-                                       "(expects {}, but {}"
-                                       .format(face.ngons, len(face.colors)))
-
-            result = parse(line, rb"[0-9]+.* CRS\(([0-9\. ]+)\)")
-            if result:
-                face.crs = [float(c) for c in decode(result[0]).split(" ")]
-                if face.ngons != len(face.crs):
-                    raise RuntimeError("Number of CRS does not match "
-                                       "(expects {}, but {}"
-                                       .format(face.ngons, len(face.crs)))
-
-            faces.append(face)
+            ngons, fields = split_face_line(line)
+
+            attrs = {}
+            for tag, value in fields:
+                if tag == b"V":
+                    attrs["vertex_indices"] = [int(v) for v in value.split()]
+                    check_count("Vertices", ngons, attrs["vertex_indices"])
+                elif tag == b"M":
+                    attrs["material"] = int(value)
+                elif tag == b"UV":
+                    attrs["uv_coords"] = [float(c) for c in value.split()]
+                    check_count("UV Coords", ngons, attrs["uv_coords"], 2)
+                elif tag == b"N":
+                    # The first quarter is the normal type of each vertex.
+                    values = value.split()
+                    attrs["normals"] = [float(n)
+                                        for n in values[len(values) // 4:]]
+                    check_count("Normals", ngons, attrs["normals"], 3)
+                elif tag == b"COL":
+                    attrs["colors"] = [int(c) for c in value.split()]
+                    check_count("Colors", ngons, attrs["colors"])
+                elif tag == b"CRS":
+                    attrs["crs"] = [float(c) for c in value.split()]
+                    check_count("CRS", ngons, attrs["crs"])
+
+            faces.append(ngons, **attrs)
 
         raise RuntimeError("Format Error: Failed to parse 'face' field.")
 
@@ -1749,8 +2627,7 @@ class MqoFile:
             if line.find(b"}") != -1:
                 return weit_list
 
-            r = re.compile(rb"([0-9]+) (-*[0-9\.]+)")
-            m = r.search(line)
+            m = WEIT_RGX.search(line)
             if not m or len(m.groups()) != 2:
                 raise RuntimeError("Invalid format. (line:{})".format(line))
 
@@ -1783,20 +2660,20 @@ class MqoFile:
         raise RuntimeError("Format Error: Failed to parse 'vertexattr' field.")
 
     def _parse_object(self, first_line):
-        r = re.compile(rb"Object \"*([^\"]+)\"* {")
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"Object"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
+        fields = OBJECT_FIELD_RGX
+
         def parse(line, rgx):
-            r = re.compile(rgx)
-            m = r.search(line)
+            m = rgx.search(line)
             if not m:
                 raise RuntimeError("Failed to parse. (line:{})".format(line))
             return m.groups()
 
         obj = Object()
-        obj.name = decode(m.group(1))
+        obj.name = self._decode(m.group(1))
         while not self._raw.eof():
             line = self._raw.get_line()
             line = remove_return(line)
@@ -1808,67 +2685,67 @@ class MqoFile:
                 return obj
 
             if line.find(b"uid ") != -1:
-                rgx = rb"uid ([0-9]+)"
+                rgx = fields[b"uid"]
                 obj.uid = int(parse(line, rgx)[0])
             elif line.find(b"depth ") != -1:
-                rgx = rb"depth ([0-9]+)"
+                rgx = fields[b"depth"]
                 obj.depth = int(parse(line, rgx)[0])
             elif line.find(b"folding ") != -1:
-                rgx = rb"folding ([0-1])"
+                rgx = fields[b"folding"]
                 obj.folding = int(parse(line, rgx)[0])
             elif line.find(b"scale ") != -1:
-                rgx = rb"scale ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"
+                rgx = fields[b"scale"]
                 obj.scale = [float(v) for v in parse(line, rgx)]
             elif line.find(b"rotation ") != -1:
-                rgx = rb"rotation ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"
+                rgx = fields[b"rotation"]
                 obj.rotation = [float(v) for v in parse(line, rgx)]
             elif line.find(b"translation ") != -1:
-                rgx = rb"translation ([-0-9\.]+) ([-0-9\.]+) ([-0-9\.]+)"
+                rgx = fields[b"translation"]
                 obj.translation = [float(v) for v in parse(line, rgx)]
             elif line.find(b"patch ") != -1:
-                rgx = rb"patch ([0-4])"
+                rgx = fields[b"patch"]
                 obj.patch = int(parse(line, rgx)[0])
             elif line.find(b"patchtri ") != -1:
-                rgx = rb"patchtri ([0-1])"
+                rgx = fields[b"patchtri"]
                 obj.patch_triangle = int(parse(line, rgx)[0])
             elif line.find(b"segment ") != -1:
-                rgx = rb"segment ([0-9]+)"
+                rgx = fields[b"segment"]
                 obj.segment = int(parse(line, rgx)[0])
             elif line.find(b"visible ") != -1:
-                rgx = rb"visible ([0-9]+)"
+                rgx = fields[b"visible"]
                 obj.visible = int(parse(line, rgx)[0])
             elif line.find(b"locking ") != -1:
-                rgx = rb"locking ([0-1])"
+                rgx = fields[b"locking"]
                 obj.locking = int(parse(line, rgx)[0])
             elif line.find(b"shading ") != -1:
-                rgx = rb"shading ([0-1])"
+                rgx = fields[b"shading"]
                 obj.shading = int(parse(line, rgx)[0])
             elif line.find(b"facet ") != -1:
-                rgx = rb"facet ([0-9\.]+)"
+                rgx = fields[b"facet"]
                 obj.facet = float(parse(line, rgx)[0])
             elif line.find(b"color ") != -1:
-                rgx = rb"color ([0-9\.]+) ([0-9\.]+) ([0-9\.]+)"
+                rgx = fields[b"color"]
                 obj.color = [float(v) for v in parse(line, rgx)]
             elif line.find(b"color_type ") != -1:
-                rgx = rb"color_type ([0-1])"
+                rgx = fields[b"color_type"]
                 obj.color_type = int(parse(line, rgx)[0])
             elif line.find(b"mirror ") != -1:
-                rgx = rb"mirror ([0-2])"
+                rgx = fields[b"mirror"]
                 obj.mirror = int(parse(line, rgx)[0])
             elif line.find(b"mirror_axis ") != -1:
-                rgx = rb"mirror_axis ([1-7])"
+                rgx = fields[b"mirror_axis"]
                 obj.mirror_axis = int(parse(line, rgx)[0])
             elif line.find(b"mirror_dis ") != -1:
-                rgx = rb"mirror_dis ([0-9\.]+)"
+                rgx = fields[b"mirror_dis"]
                 obj.mirror_distance = float(parse(line, rgx)[0])
             elif line.find(b"lathe ") != -1:
-                rgx = rb"lathe ([0-3])"
+                rgx = fields[b"lathe"]
                 obj.lathe = int(parse(line, rgx)[0])
             elif line.find(b"lathe_axis ") != -1:
-                rgx = rb"lathe_axis ([0-2])"
+                rgx = fields[b"lathe_axis"]
                 obj.lathe_axis = int(parse(line, rgx)[0])
             elif line.find(b"lathe_seg ") != -1:
-                rgx = rb"lathe_seg ([0-9]+)"
+                rgx = fields[b"lathe_seg"]
                 obj.lathe_segment = int(parse(line, rgx)[0])
             elif line.find(b"vertex ") != -1:
                 obj.add_vertices(self._parse_vertex(line))
@@ -1877,7 +2754,7 @@ class MqoFile:
             elif line.find(b"face ") != -1:
                 obj.add_faces(self._parse_face(line))
             elif line.find(b"normal_weight ") != -1:
-                rgx = rb"normal_weight ([0-9\.]+)"
+                rgx = fields[b"normal_weight"]
                 obj.normal_weight = float(parse(line, rgx)[0])
             elif line.find(b"vertexattr ") != -1:
                 obj.merge_vertexattr(self._parse_vertexattr(line))
@@ -1897,16 +2774,14 @@ class MqoFile:
     def _parse_header(self, line):
         if line != b"Metasequoia Document":
             raise RuntimeError("Header 'Metasequoia Document' is not found.")
-        return decode(line)
+        return self._decode(line)
 
     def _parse_format_and_version(self, line):
-        pattern = rb"Format (Text|Compress) Ver ([0-9]+\.[0-9]+)"
-        r = re.compile(pattern)
-        m = r.search(line)
+        m = CHUNK_HEADER_RGX[b"Format"].search(line)
         if not m or len(m.groups()) != 2:
             raise RuntimeError("Format/Version is not found.")
 
-        format_ = decode(m.group(1))
+        format_ = self._decode(m.group(1))
         version = float(m.group(2))
         return format_, version
 
@@ -1915,30 +2790,132 @@ class MqoFile:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
 
     def _parse_include_xml(self, first_line):
-        pattern = rb"IncludeXml \"(.+)\""
-        r = re.compile(pattern)
-        m = r.search(first_line)
+        m = CHUNK_HEADER_RGX[b"IncludeXml"].search(first_line)
         if not m or len(m.groups()) != 1:
             raise RuntimeError("Invalid format. (line:{})".format(first_line))
-        return decode(m.group(1))
+        return self._decode(m.group(1))
+
+    # pylint: disable=too-many-arguments
+    def load(self, filepath, use_mmap=True, lazy=False, cache=None, *,
+             max_workers=None):
+        """Load the .mqo/.mqoz file.
+
+        If lazy is True, Object chunks of the .mqo file are only scanned and
+        loaded as LazyObject, which parses the chunk on the first access.
+        .mqoz file is always parsed at once.
+
+        If cache (ParseCache) is given, the parsed data is served from or
+        stored to the cache. The whole file is parsed in this case, so lazy
+        is ignored.
+
+        If max_workers is more than 1, Object chunks of the .mqo file are
+        parsed in parallel by a process pool which has max_workers
+        processes. lazy is ignored in this case. The chunks are parsed in
+        this process if the worker processes can not be started.
+        """
+
+        if cache is not None:
+            key = cache.make_key(filepath)
+            if cache.restore(key, self):
+                return
+            self.load(filepath, use_mmap, max_workers=max_workers)
+            cache.store(key, self)
+            return
+
+        if max_workers is not None and max_workers > 1 and \
+                pathlib.Path(filepath).suffix.lower() == ".mqo":
+            self.load(filepath, use_mmap, lazy=True)
+            self._load_objects_parallel(max_workers)
+            return
 
-    def load(self, filepath):
+        self._chunks = []
+        self._lazy = False
         if pathlib.Path(filepath).suffix.lower() == ".mqo":
+            # The mapping stays valid after the file is closed.
             with open(filepath, "rb") as f:
-                self._raw = RawData(f.read())
-        else:
-            with zipfile.ZipFile(filepath) as zfile:
-                zinfo = None
-                for info in zfile.infolist():
-                    if pathlib.Path(info.filename).suffix.lower() == ".mqo":
-                        zinfo = info
-                        break
-                else:
-                    raise RuntimeError("No *.mqo found in {}".format(filepath))
-                with zfile.open(zinfo) as f:
-                    self._raw = RawData(f.read())
+                self._raw = RawData.from_file(f, use_mmap)
+            self._filepath = filepath
+            self._file_size = len(self._raw.data)
+            self._use_mmap = use_mmap
+            self._lazy = lazy
+            self._parse()
+            return
+
+        with zipfile.ZipFile(filepath) as zfile:
+            zinfo = None
+            for info in zfile.infolist():
+                if pathlib.Path(info.filename).suffix.lower() == ".mqo":
+                    zinfo = info
+                    break
+            else:
+                raise RuntimeError("No *.mqo found in {}".format(filepath))
+            # Parse while decompressing instead of inflating the whole
+            # document up front.
+            with zfile.open(zinfo) as f:
+                self._raw = StreamRawData(f)
+                self._parse()
+
+    def _load_objects_parallel(self, max_workers):
+        chunks = [obj.get_chunk_info() for obj in self._objects]
+        if not chunks:
+            return
 
+        # Several small objects are sent to a worker at once.
+        chunksize = max(1, len(chunks) // (max_workers * 4))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers) \
+                    as executor:
+                # Results are returned in the order of chunks.
+                self._objects = list(executor.map(
+                    parse_object_chunk,
+                    itertools.repeat(self._filepath),
+                    itertools.repeat(self._file_size),
+                    chunks,
+                    itertools.repeat(self._encoding),
+                    itertools.repeat(self._use_mmap),
+                    chunksize=chunksize))
+        except concurrent.futures.BrokenExecutor:
+            # Worker processes can not be started in some environments
+            # (e.g. this module can not be imported by the spawned
+            # processes), so the objects are parsed in this process.
+            for obj in self._objects:
+                obj.load()
+
+    def _load_object(self, chunk):
+        with open(self._filepath, "rb") as f:
+            raw = RawData.from_file(f, self._use_mmap)
+        if len(raw.data) != self._file_size:
+            raw.close()
+            raise RuntimeError("{} was modified after loaded."
+                               .format(self._filepath))
+
+        raw.seek = chunk.offset
+        self._raw = raw
+        try:
+            line = remove_return(raw.get_line()).strip()
+            return self._parse_object(line)
+        finally:
+            raw.close()
+            self._raw = None
+
+    def _decode(self, str_):
+        if self._encoding is None:
+            try:
+                return str_.decode("ascii")
+            except UnicodeDecodeError:
+                self._encoding = detect_encoding(str_)
+        return decode(str_, self._encoding)
+
+    def _parse(self):
+        self._encoding = None
+        try:
+            self._parse_document()
+        finally:
+            self._raw.close()
+
+    def _parse_document(self):
         while not self._raw.eof():
+            offset = self._raw.seek
             line = self._raw.get_line()
             line = remove_return(line)
             line = line.strip()
@@ -1970,28 +2947,605 @@ class MqoFile:
                 self._parse_thumbnail(line)
             elif line.find(b"Scene") != -1:
                 self._scene = self._parse_scene(line)
+                self._add_chunk_info("Scene", offset)
             elif line.find(b"Material ") != -1:
                 self._materials = self._parse_material(line)
+                self._add_chunk_info("Material", offset)
             elif line.find(b"Object") != -1:
-                self._objects.append(self._parse_object(line))
+                if self._lazy:
+                    obj = self._scan_object(line, offset)
+                    self._chunks.append(obj.get_chunk_info())
+                else:
+                    obj = self._parse_object(line)
+                self._objects.append(obj)
 
-    def save(self, filepath):
-        s = "Metasequoia Document\n"
-        s += "Format {} Ver {}\n".format(self._format, self._version)
-        s += "\n"
+    def _add_chunk_info(self, kind, offset):
+        if not self._lazy:
+            return
+        chunk = ChunkInfo(kind, offset)
+        chunk.length = self._raw.seek - offset
+        self._chunks.append(chunk)
 
-        s += self._scene.to_str(fmt='MQO_FILE')
+    def _skip_block(self, first_line, key):
+        """Skip the vertex/face chunk and return the number of elements
+        written in its header."""
+
+        m = CHUNK_HEADER_RGX[key].search(first_line)
+        if not m or len(m.groups()) != 1:
+            raise RuntimeError("Invalid format. (line:{})".format(first_line))
+        if not self._raw.skip_until(b"}"):
+            raise RuntimeError("Format Error: Failed to parse '{}' field."
+                               .format(key.decode()))
+        self._raw.get_line()
+        return int(m.group(1))
+
+    def _skip_bvertex(self, first_line):
+        """Skip the BVertex chunk without decoding the payload and return
+        the number of vertices written in its Vector header."""
+
+        m = CHUNK_HEADER_RGX[b"BVertex"].search(first_line)
+        if not m or len(m.groups()) != 1:
+            raise RuntimeError("Invalid format. (line:{})".format(first_line))
+        num_verts = int(m.group(1))
+
+        line = remove_return(self._raw.get_line()).strip()
+        m = CHUNK_HEADER_RGX[b"Vector"].search(line)
+        if not m or len(m.groups()) != 2:
+            raise RuntimeError("Invalid format. (line:{})".format(line))
+        num_vectors = int(m.group(1))
+        num_bytes = int(m.group(2))
+        if num_verts != num_vectors or num_bytes != num_vectors * 12:
+            raise RuntimeError("Number of Vertices does not match "
+                               "(expects {}, but {} [{}])"
+                               .format(num_verts, num_vectors, num_bytes))
+        if not self._raw.skip(num_bytes):
+            raise RuntimeError("Format Error: Failed to parse 'BVertex' "
+                               "field.")
+        self._skip_chunk()
+        return num_verts
+
+    def _scan_object(self, first_line, offset):
+        m = CHUNK_HEADER_RGX[b"Object"].search(first_line)
+        if not m or len(m.groups()) != 1:
+            raise RuntimeError("Invalid format. (line:{})".format(first_line))
+
+        chunk = ChunkInfo("Object", offset)
+        chunk.name = self._decode(m.group(1))
+        while not self._raw.eof():
+            line = self._raw.get_line()
+            line = remove_return(line)
+            line = line.strip()
+
+            if line.find(b"}") != -1:
+                chunk.length = self._raw.seek - offset
+                return LazyObject(self, chunk)
+
+            if line.find(b"depth ") != -1:
+                m = OBJECT_FIELD_RGX[b"depth"].search(line)
+                if not m:
+                    raise RuntimeError("Failed to parse. (line:{})"
+                                       .format(line))
+                chunk.depth = int(m.group(1))
+            elif line.find(b"vertex ") != -1:
+                chunk.num_vertices += self._skip_block(line, b"vertex")
+            elif line.find(b"BVertex ") != -1:
+                chunk.num_vertices += self._skip_bvertex(line)
+            elif line.find(b"face ") != -1:
+                chunk.num_faces += self._skip_block(line, b"face")
+            elif line.find(b"{") != -1:
+                self._skip_chunk()
+
+        raise RuntimeError("Format Error: Failed to parse 'Object' field.")
+
+    def save(self, filepath, compress_level=None, binary_vertex=False):
+        """Save to the .mqo/.mqoz file.
+
+        .mqoz file is a zip archive which has the deflated .mqo file.
+        compress_level (0-9) is the deflate level for .mqoz file.
+        If binary_vertex is True, vertices are saved as little-endian
+        float32 in 'BVertex' chunk.
+        """
+
+        if pathlib.Path(filepath).suffix.lower() == ".mqoz":
+            self._save_mqoz(filepath, compress_level, binary_vertex)
+            return
+
+        # Text is encoded and written through the buffered file while the
+        # document is generated, so the whole document is never held in
+        # memory.
+        with open(filepath, "w", encoding="utf-8", newline="\n") as f:
+            self.write(f, binary_vertex)
+
+    def _save_mqoz(self, filepath, compress_level, binary_vertex):
+        arcname = pathlib.Path(filepath).stem + ".mqo"
+        with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED,
+                             compresslevel=compress_level) as zfile:
+            # Deflate the text while the document is generated.
+            with zfile.open(arcname, "w", force_zip64=True) as raw:
+                f = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+                self.write(f, binary_vertex)
+                f.close()
+
+    def write(self, out, binary_vertex=False):
+        """Write the document to the text stream."""
+
+        out.write("Metasequoia Document\n")
+        out.write("Format {} Ver {}\n".format(self._format, self._version))
+        out.write("\n")
+
+        if self._scene is not None:
+            self._scene.write(out)
 
         if len(self._materials) > 0:
-            s += "Material {}".format(len(self._materials)) + " {\n"
+            out.write("Material {}".format(len(self._materials)) + " {\n")
             for mtrl in self._materials:
-                s += mtrl.to_str(fmt='MQO_FILE')
-            s += "}\n"
+                mtrl.write(out)
+            out.write("}\n")
 
         for obj in self._objects:
-            s += obj.to_str(fmt='MQO_FILE')
+            obj.write(out, binary_vertex)
+
+        out.write("Eof\n\n")
+
+
+class ParseCache:
+    """On-disk cache of the parsed MqoFile.
+
+    An entry is stored per source file path. It consists of the magic, the
+    length of the JSON header, the JSON header which holds the key and all
+    fields except the arrays, and the raw bytes of the arrays. The entry is
+    valid only if the path, size, mtime and SHA-1 of the source file match.
+    Entries are evicted in least recently used order when the total size
+    exceeds max_size.
+    """
+
+    MAGIC = b"BLMQOC01"
+    EXTENSION = ".blmqoc"
+
+    # Arrays of FaceBuffer stored in the entry.
+    FACE_COLUMNS = ("ngons", "loop_starts", "materials", "vertex_indices",
+                    "uv_coords", "normals", "colors", "crs")
+
+    def __init__(self, directory, max_size=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+
+    def make_key(self, filepath):
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        sha1 = hashlib.sha1()
+        with open(filepath, "rb") as f:
+            if stat.st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    sha1.update(mm)
+        return {
+            "path": filepath,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha1": sha1.hexdigest(),
+        }
+
+    def _entry_path(self, key):
+        name = hashlib.sha1(key["path"].encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ParseCache.EXTENSION)
+
+    def restore(self, key, mqo_file):
+        """Restore the cached data into mqo_file. Returns False if there is
+        no valid entry."""
+
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
 
-        s += "Eof\n\n"
+        try:
+            header, arrays = self._decode_entry(data)
+            if header["key"] != key:
+                return False
+            self._restore_mqo_file(header["mqo_file"], arrays, mqo_file)
+        except (ValueError, KeyError, IndexError, TypeError, struct.error):
+            # Broken or incompatible entry is just ignored and overwritten.
+            return False
 
-        with open(filepath, "wb") as f:
-            f.write(s.encode('UTF-8'))
+        # Mark as recently used. The entry may have been evicted by another
+        # process, or the cache directory may be read only.
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return True
+
+    def store(self, key, mqo_file):
+        """Store mqo_file as the entry of key. The cache is optional, so
+        failures on writing the entry are ignored."""
+
+        arrays = []
+        header = {
+            "key": key,
+            "byteorder": sys.byteorder,
+            "mqo_file": self._dump_mqo_file(mqo_file, arrays),
+        }
+        header["arrays"] = [(buf.typecode, buf.itemsize, len(buf))
+                            for buf in arrays]
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        entry_path = self._entry_path(key)
+        tmp_path = "{}.{}.tmp".format(entry_path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(ParseCache.MAGIC)
+                f.write(struct.pack("<I", len(header_bytes)))
+                f.write(header_bytes)
+                for buf in arrays:
+                    buf.tofile(f)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._evict()
+
+    def _evict(self):
+        # Entries may be evicted by other processes at the same time.
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(ParseCache.EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _decode_entry(self, data):
+        magic_len = len(ParseCache.MAGIC)
+        if data[:magic_len] != ParseCache.MAGIC:
+            raise ValueError("Not a cache entry.")
+        header_len = struct.unpack_from("<I", data, magic_len)[0]
+        start = magic_len + 4
+        header = json.loads(data[start:start + header_len].decode("utf-8"))
+
+        offset = start + header_len
+        arrays = []
+        view = memoryview(data)
+        for typecode, itemsize, count in header["arrays"]:
+            buf = array.array(typecode)
+            if buf.itemsize != itemsize:
+                raise ValueError("Incompatible array item size.")
+            if offset + itemsize * count > len(data):
+                raise ValueError("Truncated cache entry.")
+            buf.frombytes(view[offset:offset + itemsize * count])
+            if header["byteorder"] != sys.byteorder:
+                buf.byteswap()
+            arrays.append(buf)
+            offset += itemsize * count
+        if offset != len(data):
+            raise ValueError("Size of cache entry does not match.")
+        return header, arrays
+
+    def _dump_slots(self, instance):
+        return {key: getattr(instance, key) for key in instance.__slots__}
+
+    def _load_slots(self, cls, fields):
+        instance = cls()
+        for key in cls.__slots__:
+            setattr(instance, key, fields[key])
+        return instance
+
+    def _dump_mqo_file(self, mqo_file, arrays):
+        fields = vars(mqo_file)
+
+        scene = fields["_scene"]
+        scene_dict = None
+        if scene is not None:
+            scene_dict = self._dump_slots(scene)
+            scene_dict["_dirlights"] = [
+                self._dump_slots(light) for light in scene_dict["_dirlights"]]
+
+        return {
+            "header": fields["_header"],
+            "version": fields["_version"],
+            "format": fields["_format"],
+            "scene": scene_dict,
+            "materials": [self._dump_slots(m)
+                          for m in fields["_materials"]],
+            "objects": [self._dump_object(obj, arrays)
+                        for obj in fields["_objects"]],
+        }
+
+    def _dump_object(self, obj, arrays):
+        if isinstance(obj, LazyObject):
+            obj.load()
+
+        def add_array(buf):
+            if buf is None:
+                return None
+            arrays.append(buf)
+            return len(arrays) - 1
+
+        obj_dict = {}
+        for key, value in vars(obj).items():
+            if key in ("_vertices", "_faces", "_uniq_faces", "_vertex_attrs",
+                       "_mqo_file", "_chunk"):
+                continue
+            obj_dict[key] = value
+
+        faces = obj.get_face_buffer()
+        obj_dict["_vertices"] = add_array(obj.get_vertex_buffer())
+        obj_dict["_faces"] = {
+            column: add_array(getattr(faces, column))
+            for column in ParseCache.FACE_COLUMNS}
+        obj_dict["_faces"]["flags"] = add_array(
+            array.array('B', faces.flags))
+
+        attrs = vars(obj).get("_vertex_attrs")
+        if attrs is not None:
+            obj_dict["_vertex_attrs"] = {
+                "uid": attrs.uid,
+                "weit": sorted(attrs.weit.items()),
+                "color": attrs.color,
+            }
+        else:
+            obj_dict["_vertex_attrs"] = None
+
+        return obj_dict
+
+    def _restore_mqo_file(self, mqo_dict, arrays, mqo_file):
+        scene = None
+        if mqo_dict["scene"] is not None:
+            scene_dict = dict(mqo_dict["scene"])
+            scene_dict["_dirlights"] = [
+                self._load_slots(DirLight, light)
+                for light in scene_dict["_dirlights"]]
+            scene = self._load_slots(Scene, scene_dict)
+
+        materials = [self._load_slots(Material, m)
+                     for m in mqo_dict["materials"]]
+        objects = [self._restore_object(o, arrays)
+                   for o in mqo_dict["objects"]]
+
+        mqo_file.header = mqo_dict["header"]
+        mqo_file.version = mqo_dict["version"]
+        mqo_file.format = mqo_dict["format"]
+        mqo_file.scene = scene
+        for mtrl in materials:
+            mqo_file.add_material(mtrl)
+        for obj in objects:
+            mqo_file.add_object(obj)
+
+    def _check_face_buffer(self, faces):
+        num_faces = len(faces.ngons)
+        if len(faces.loop_starts) != num_faces + 1 or \
+                len(faces.flags) != num_faces or \
+                len(faces.materials) != num_faces or \
+                len(faces.vertex_indices) != faces.num_loops():
+            raise ValueError("Broken faces in cache entry.")
+        for attr, (_, _, width) in FaceBuffer.LOOP_ATTRIBUTES.items():
+            column = getattr(faces, attr)
+            if column is not None and \
+                    len(column) != faces.num_loops() * width:
+                raise ValueError("Broken faces in cache entry.")
+
+    def _restore_object(self, obj_dict, arrays):
+        obj = Object()
+        faces_dict = obj_dict["_faces"]
+        vertex_attrs = obj_dict["_vertex_attrs"]
+        for key, value in obj_dict.items():
+            if key not in ("_vertices", "_faces", "_vertex_attrs"):
+                setattr(obj, key, value)
+
+        vertices = arrays[obj_dict["_vertices"]]
+        if len(vertices) % 3 != 0:
+            raise ValueError("Broken vertices in cache entry.")
+        obj.add_vertices(vertices)
+
+        faces = FaceBuffer()
+        for column in ParseCache.FACE_COLUMNS:
+            index = faces_dict[column]
+            if index is not None:
+                setattr(faces, column, arrays[index])
+        faces.flags = bytearray(arrays[faces_dict["flags"]].tobytes())
+        self._check_face_buffer(faces)
+        obj.add_faces(faces)
+
+        if vertex_attrs is not None:
+            attrs = Object.VertexAttr()
+            attrs.uid = vertex_attrs["uid"]
+            attrs.weit = dict(vertex_attrs["weit"])
+            attrs.color = vertex_attrs["color"]
+            obj.merge_vertexattr(attrs)
+
+        return obj
+
+
+def validate_mqo_file(mqo_file):
+    """Return the list of problems found in the loaded data."""
+
+    problems = []
+    num_materials = len(mqo_file.get_materials())
+    for obj in mqo_file.get_objects():
+        num_verts = len(obj.get_vertex_buffer()) // 3
+        faces = obj.get_face_buffer()
+        vertex_indices = faces.vertex_indices
+        if len(vertex_indices) > 0 and \
+                not 0 <= min(vertex_indices) <= max(vertex_indices) \
+                < num_verts:
+            problems.append("Object '{}': vertex index out of range"
+                            .format(obj.name))
+        materials = [m for m, flags in zip(faces.materials, faces.flags)
+                     if flags & FaceBuffer.HAS_MATERIAL]
+        if materials and \
+                not 0 <= min(materials) <= max(materials) < num_materials:
+            problems.append("Object '{}': material index out of range"
+                            .format(obj.name))
+    return problems
+
+
+def run_batch_task(command, filepath, output_path=None, compress_level=None):
+    """Process a file for the command line interface. This is called in
+    the worker processes, so the result is a plain tuple of
+    (filepath, size, elapsed seconds, error, message).
+    'resave' overwrites the file in place if output_path is None."""
+
+    start = time.perf_counter()
+    size = os.path.getsize(filepath)
+    try:
+        mqo_file = MqoFile()
+        if command == "stats":
+            mqo_file.load(filepath, lazy=True)
+            num_verts = 0
+            num_faces = 0
+            for obj in mqo_file.get_objects():
+                if isinstance(obj, LazyObject) and not obj.is_loaded():
+                    chunk = obj.get_chunk_info()
+                    num_verts += chunk.num_vertices
+                    num_faces += chunk.num_faces
+                else:
+                    num_verts += len(obj.get_vertex_buffer()) // 3
+                    num_faces += len(obj.get_face_buffer())
+            message = "objects={} materials={} vertices={} faces={}".format(
+                len(mqo_file.get_objects()), len(mqo_file.get_materials()),
+                num_verts, num_faces)
+        elif command == "validate":
+            mqo_file.load(filepath)
+            problems = validate_mqo_file(mqo_file)
+            if problems:
+                return (filepath, size, time.perf_counter() - start,
+                        "; ".join(problems), "")
+            message = "valid"
+        elif command == "resave":
+            mqo_file.load(filepath)
+            out_path = filepath if output_path is None else output_path
+            out_dir = os.path.dirname(out_path)
+            if out_dir != "":
+                os.makedirs(out_dir, exist_ok=True)
+            mqo_file.save(out_path, compress_level)
+            message = "saved to {}".format(out_path)
+        else:
+            raise RuntimeError("Unknown command '{}'".format(command))
+    except Exception as e:     # pylint: disable=broad-except
+        return (filepath, size, time.perf_counter() - start,
+                "{}: {}".format(type(e).__name__, e), "")
+
+    return filepath, size, time.perf_counter() - start, None, message
+
+
+def collect_mqo_files(paths):
+    """Return the list of (filepath, path relative to the input root).
+    The relative path of a file given directly is its file name."""
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if pathlib.Path(name).suffix.lower() in (".mqo",
+                                                             ".mqoz"):
+                        filepath = os.path.join(root, name)
+                        files.append(
+                            (filepath, os.path.relpath(filepath, path)))
+        else:
+            files.append((path, os.path.basename(path)))
+    return files
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "must be 1 or more, but {} is given".format(value))
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Batch process .mqo/.mqoz files without Blender")
+    parser.add_argument("command", choices=["validate", "stats", "resave"],
+                        help="validate: check that files can be loaded, "
+                             "stats: print the number of elements, "
+                             "resave: save files in the normalized form")
+    parser.add_argument("paths", nargs="+",
+                        help="Files or directories to process")
+    parser.add_argument("-j", "--workers", type=positive_int,
+                        default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="Output directory of 'resave'. Files keep "
+                             "their paths relative to the given directory "
+                             "(default: overwrite in place)")
+    parser.add_argument("-l", "--compress-level", type=int, default=None,
+                        choices=range(10), metavar="{0-9}",
+                        help="Deflate level of .mqoz files for 'resave'")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Do not print per-file results")
+    args = parser.parse_args(argv)
+
+    collected = collect_mqo_files(args.paths)
+    files = [filepath for filepath, _ in collected]
+    if args.command == "resave" and args.output_dir is not None:
+        output_paths = [os.path.join(args.output_dir, relpath)
+                        for _, relpath in collected]
+        seen = {}
+        for filepath, out_path in zip(files, output_paths):
+            key = os.path.normcase(os.path.normpath(out_path))
+            if key in seen:
+                parser.error("'{}' and '{}' are saved to the same path '{}'"
+                             .format(seen[key], filepath, out_path))
+            seen[key] = filepath
+    else:
+        output_paths = [None] * len(files)
+    chunksize = max(1, min(64, len(files) // (args.workers * 4)))
+
+    start = time.perf_counter()
+    total_size = 0
+    num_errors = 0
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+        results = executor.map(run_batch_task,
+                               itertools.repeat(args.command), files,
+                               output_paths,
+                               itertools.repeat(args.compress_level),
+                               chunksize=chunksize)
+        for filepath, size, elapsed, error, message in results:
+            total_size += size
+            if error is not None:
+                num_errors += 1
+                print("NG {:>8.3f}s {}: {}".format(elapsed, filepath, error))
+            elif not args.quiet:
+                print("OK {:>8.3f}s {}: {}".format(elapsed, filepath,
+                                                   message))
+    elapsed = time.perf_counter() - start
+
+    print("{} files ({} errors), {:.1f} MB in {:.3f}s: {:.1f} files/s, "
+          "{:.2f} MB/s".format(len(files), num_errors,
+                               total_size / (1024 * 1024), elapsed,
+                               len(files) / elapsed if elapsed > 0 else 0,
+                               total_size / (1024 * 1024) / elapsed
+                               if elapsed > 0 else 0))
+
+    return 1 if num_errors > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,2 +1,3 @@
 from . import import_test
 from . import export_test
+from . import mqo_file_test
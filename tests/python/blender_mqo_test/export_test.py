@@ -1,4 +1,5 @@
 import os
+import zipfile
 
 import bpy
 
@@ -118,6 +119,75 @@ class TestExportMqo(common.TestBase):
 
         self._is_same_mqo_file(export_mqo_file, import_mqo_file)
 
+    def test_export_mqo_single_object_compressed(self):
+        import_filepath = "{}/{}/single_object.mqo".format(
+            os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
+        bpy.ops.import_scene.blmqo_ot_import_mqo('EXEC_DEFAULT',
+                                                 filepath=import_filepath,
+                                                 add_import_prefix=False,
+                                                 import_prefix="")
+
+        # The extension is changed to .mqoz when the compression is enabled.
+        export_filepath = "{}/single_object_compressed.mqo".format(
+            EXPORTED_DIR)
+        bpy.ops.export_scene.blmqo_ot_export_mqo('EXEC_DEFAULT',
+                                                 filepath=export_filepath,
+                                                 add_export_prefix=False,
+                                                 export_prefix="",
+                                                 compress=True,
+                                                 compression_level=9)
+        export_filepath = "{}/single_object_compressed.mqoz".format(
+            EXPORTED_DIR)
+        self.assertTrue(zipfile.is_zipfile(export_filepath))
+        export_mqo_file = MqoFile()
+        export_mqo_file.load(export_filepath)
+
+        import_mqo_file = MqoFile()
+        import_mqo_file.load(import_filepath)
+
+        self._is_same_mqo_file(export_mqo_file, import_mqo_file)
+
+    def test_export_mqo_single_object_binary_vertex(self):
+        import_filepath = "{}/{}/single_object.mqo".format(
+            os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
+        bpy.ops.import_scene.blmqo_ot_import_mqo('EXEC_DEFAULT',
+                                                 filepath=import_filepath,
+                                                 add_import_prefix=False,
+                                                 import_prefix="")
+        import_mqo_file = MqoFile()
+        import_mqo_file.load(import_filepath)
+
+        for ext, compress in ((".mqo", False), (".mqoz", True)):
+            export_filepath = "{}/single_object_binary_vertex{}".format(
+                EXPORTED_DIR, ext)
+            bpy.ops.export_scene.blmqo_ot_export_mqo('EXEC_DEFAULT',
+                                                     filepath=export_filepath,
+                                                     add_export_prefix=False,
+                                                     export_prefix="",
+                                                     compress=compress,
+                                                     binary_vertex=True)
+            if compress:
+                with zipfile.ZipFile(export_filepath) as zfile:
+                    data = zfile.read(zfile.namelist()[0])
+            else:
+                with open(export_filepath, "rb") as f:
+                    data = f.read()
+            self.assertIn(b"BVertex", data)
+
+            export_mqo_file = MqoFile()
+            export_mqo_file.load(export_filepath)
+            self._is_same_mqo_file(export_mqo_file, import_mqo_file)
+
+            # Vertices are stored as float32.
+            for export_obj, import_obj in zip(export_mqo_file.get_objects(),
+                                              import_mqo_file.get_objects()):
+                for export_v, import_v in zip(export_obj.get_vertices(),
+                                              import_obj.get_vertices()):
+                    for export_co, import_co in zip(export_v, import_v):
+                        self.assertAlmostEqual(
+                            export_co, import_co,
+                            delta=1e-6 * max(1.0, abs(import_co)))
+
     def test_export_mqo_multiple_objects(self):
         import_filepath = "{}/{}/multiple_objects.mqo".format(
             os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
@@ -1,10 +1,13 @@
 import os
+import tempfile
 
 import bpy
 
 try:
+    from blender_mqo.utils import mqo_file as mqo
     from blender_mqo.utils.mqo_file import MqoFile
 except:     # pylint: disable=W0702 # noqa
+    from bl_ext.user_default.blender_mqo.utils import mqo_file as mqo
     from bl_ext.user_default.blender_mqo.utils.mqo_file import MqoFile
 from . import common
 
@@ -130,6 +133,36 @@ class TestImportMqo(common.TestBase):
 
         self._valid_object(mqo_file, "obj1", 8, 6)
 
+    def test_import_mqo_empty_object(self):
+        filepath = "{}/{}/empty_object.mqo".format(
+            os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
+        bpy.ops.import_scene.blmqo_ot_import_mqo('EXEC_DEFAULT',
+                                                 filepath=filepath,
+                                                 add_import_prefix=False,
+                                                 import_prefix="")
+
+        self.assertEqual(len(bpy.data.objects), 1,
+                         "Number of imported objects")
+
+        mqo_file = MqoFile()
+        mqo_file.load(filepath)
+
+        self._valid_object(mqo_file, "empty", 0, 0)
+
+        # The parser without NumPy must give the same result.
+        orig_numpy = mqo.numpy
+        mqo.numpy = None
+        try:
+            mqo_file_without_numpy = MqoFile()
+            mqo_file_without_numpy.load(filepath)
+        finally:
+            mqo.numpy = orig_numpy
+        self.assertEqual(
+            [o.to_str(fmt='MQO_FILE') for o in mqo_file.get_objects()],
+            [o.to_str(fmt='MQO_FILE')
+             for o in mqo_file_without_numpy.get_objects()],
+            "Same objects without NumPy")
+
     def test_import_mqo_single_object_with_dup_vertices(self):
         filepath = "{}/{}/single_object_with_dup_vertices.mqo".format(
             os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
@@ -412,3 +445,30 @@ class TestImportMqo(common.TestBase):
         mqo_file.load(filepath)
 
         self._valid_object(mqo_file, "obj1", 8, 6)
+
+    def test_import_mqo_broken_object(self):
+        filepath = "{}/{}/multiple_objects.mqo".format(
+            os.path.dirname(os.path.abspath(__file__)), MQO_FILE_DIR)
+        with open(filepath, "rb") as f:
+            data = f.read()
+        face_pos = data.index(b"face 60 {")
+        broken_files = {
+            # File ends in the middle of the second object.
+            "truncated.mqo": data[:face_pos + 200],
+            # Found at parsing the second object, but not at scanning.
+            "face_count.mqo": data.replace(b"face 60 {", b"face 61 {"),
+        }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for filename, broken in broken_files.items():
+                broken_path = os.path.join(tmpdir, filename)
+                with open(broken_path, "wb") as f:
+                    f.write(broken)
+                ret = bpy.ops.import_scene.blmqo_ot_import_mqo(
+                    'EXEC_DEFAULT', filepath=broken_path,
+                    add_import_prefix=False, import_prefix="")
+
+                self.assertEqual(ret, {'CANCELLED'},
+                                 "Import of {} is cancelled".format(filename))
+                self.assertEqual(len(bpy.data.objects), 0,
+                                 "Number of imported objects")
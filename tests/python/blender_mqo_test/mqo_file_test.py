@@ -0,0 +1,323 @@
+import io
+import os
+import glob
+import shutil
+import tempfile
+import contextlib
+
+import bpy
+
+try:
+    from blender_mqo.utils import mqo_file as mqo
+    from blender_mqo.utils.mqo_file import MqoFile
+except:     # pylint: disable=W0702 # noqa
+    from bl_ext.user_default.blender_mqo.utils import mqo_file as mqo
+    from bl_ext.user_default.blender_mqo.utils.mqo_file import MqoFile
+from . import common
+
+
+MQO_FILE_DIR = "mqo_files"
+
+
+def fixture_path(filename):
+    return "{}/{}/{}".format(os.path.dirname(os.path.abspath(__file__)),
+                             MQO_FILE_DIR, filename)
+
+
+def objects_str(mqo_file):
+    return [o.to_str(fmt='MQO_FILE') for o in mqo_file.get_objects()]
+
+
+def run_main(argv):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        ret = mqo.main(argv)
+    return ret, out.getvalue()
+
+
+class TestMqoFile(common.TestBase):
+    module_name = "mqo_file"
+
+    def setUpEachMethod(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _copy_fixture(self, filename):
+        path = os.path.join(self.tmpdir, filename)
+        shutil.copy2(fixture_path(filename), path)
+        return path
+
+    def _cache_entries(self):
+        return glob.glob(os.path.join(self.cache_dir,
+                                      "*" + mqo.ParseCache.EXTENSION))
+
+    def _load_without_cache(self, filepath):
+        mqo_file = MqoFile()
+        mqo_file.load(filepath)
+        return mqo_file
+
+    def test_parse_cache_import_twice(self):
+        filepath = fixture_path("single_object.mqo")
+        if common.check_version(2, 80, 0) >= 0:
+            user_prefs = bpy.context.preferences
+        else:
+            user_prefs = bpy.context.user_preferences
+        prefs = user_prefs.addons[self.package_name].preferences
+        prefs.use_parse_cache = True
+        prefs.parse_cache_directory = self.cache_dir
+        try:
+            for _ in range(2):
+                bpy.ops.import_scene.blmqo_ot_import_mqo(
+                    'EXEC_DEFAULT', filepath=filepath,
+                    add_import_prefix=False, import_prefix="")
+                self.assertEqual(len(self._cache_entries()), 1,
+                                 "Number of cache entries")
+        finally:
+            prefs.use_parse_cache = False
+            prefs.parse_cache_directory = ""
+
+        mqo_file = self._load_without_cache(filepath)
+        mqo_obj = mqo_file.get_objects()[0]
+        self.assertEqual(len(bpy.data.objects), 2,
+                         "Number of imported objects")
+        for bl_obj in bpy.data.objects:
+            common.select_object_only(bl_obj.name)
+            if common.check_version(2, 80, 0) >= 0:
+                bpy.context.view_layer.objects.active = bl_obj
+            else:
+                bpy.context.scene.objects.active = bl_obj
+            self.assertTrue(common.valid_vertices(bl_obj, mqo_obj),
+                            "Valid Vertices")
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+    def test_parse_cache_hit(self):
+        filepath = fixture_path("multiple_materials.mqo")
+        cache = mqo.ParseCache(self.cache_dir)
+
+        mqo_file = MqoFile()
+        mqo_file.load(filepath, cache=cache)
+        self.assertEqual(len(self._cache_entries()), 1,
+                         "Number of cache entries")
+
+        cached = MqoFile()
+        self.assertTrue(cache.restore(cache.make_key(filepath), cached),
+                        "Served from the cache")
+        expected = self._load_without_cache(filepath)
+        self.assertEqual(objects_str(cached), objects_str(expected))
+        self.assertEqual(
+            [m.to_str(fmt='MQO_FILE') for m in cached.get_materials()],
+            [m.to_str(fmt='MQO_FILE') for m in expected.get_materials()])
+
+    def test_parse_cache_miss_on_mtime_change(self):
+        filepath = self._copy_fixture("single_object.mqo")
+        cache = mqo.ParseCache(self.cache_dir)
+        MqoFile().load(filepath, cache=cache)
+
+        stat = os.stat(filepath)
+        os.utime(filepath, ns=(stat.st_atime_ns,
+                               stat.st_mtime_ns + 10 ** 9))
+        self.assertFalse(cache.restore(cache.make_key(filepath), MqoFile()),
+                         "Cache miss after mtime is changed")
+
+    def test_parse_cache_miss_on_content_change(self):
+        filepath = self._copy_fixture("single_object.mqo")
+        cache = mqo.ParseCache(self.cache_dir)
+        MqoFile().load(filepath, cache=cache)
+
+        # Same size and mtime, but different content.
+        stat = os.stat(filepath)
+        with open(filepath, "rb") as f:
+            data = f.read()
+        with open(filepath, "wb") as f:
+            f.write(data.replace(b"-100 100 100", b"-100 100 101", 1))
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertFalse(cache.restore(cache.make_key(filepath), MqoFile()),
+                         "Cache miss after content is changed")
+
+        mqo_file = MqoFile()
+        mqo_file.load(filepath, cache=cache)
+        self.assertEqual(objects_str(mqo_file),
+                         objects_str(self._load_without_cache(filepath)))
+
+    def test_parse_cache_broken_entry(self):
+        filepath = fixture_path("single_object.mqo")
+        cache = mqo.ParseCache(self.cache_dir)
+        MqoFile().load(filepath, cache=cache)
+        entry_path = self._cache_entries()[0]
+        with open(entry_path, "rb") as f:
+            data = f.read()
+        expected = objects_str(self._load_without_cache(filepath))
+
+        truncated = data[:-30]
+        corrupted = data[:8] + b"\xff\xff\xff\xff" + data[12:]
+        for broken in (truncated, corrupted):
+            with open(entry_path, "wb") as f:
+                f.write(broken)
+            self.assertFalse(
+                cache.restore(cache.make_key(filepath), MqoFile()),
+                "Broken entry is not served")
+
+            # Falls back to parse the file, and the entry is rewritten.
+            mqo_file = MqoFile()
+            mqo_file.load(filepath, cache=cache)
+            self.assertEqual(objects_str(mqo_file), expected)
+            self.assertTrue(
+                cache.restore(cache.make_key(filepath), MqoFile()),
+                "Entry is rewritten")
+
+    def test_parse_cache_eviction(self):
+        filenames = ["single_object.mqo", "multiple_objects.mqo",
+                     "multiple_materials.mqo", "vertexattr.mqo"]
+        cache = mqo.ParseCache(self.cache_dir)
+        for filename in filenames:
+            MqoFile().load(fixture_path(filename), cache=cache)
+        entry_sizes = [os.path.getsize(p) for p in self._cache_entries()]
+        shutil.rmtree(self.cache_dir)
+
+        # Room for the two largest entries, but not for all.
+        cache = mqo.ParseCache(self.cache_dir, max(entry_sizes) * 2)
+        self.assertLess(cache.max_size, sum(entry_sizes))
+        for filename in filenames:
+            MqoFile().load(fixture_path(filename), cache=cache)
+            total = sum(os.path.getsize(p) for p in self._cache_entries())
+            self.assertLessEqual(total, cache.max_size,
+                                 "Total size of cache entries")
+        self.assertLess(len(self._cache_entries()), len(filenames),
+                        "Entries are evicted")
+        # The most recently stored entry is kept.
+        self.assertTrue(cache.restore(
+            cache.make_key(fixture_path(filenames[-1])), MqoFile()))
+
+    def test_main_stats(self):
+        ret, output = run_main(["stats", "-j", "1",
+                                os.path.dirname(fixture_path("simple.mqo"))])
+        self.assertEqual(ret, 0, "Exit status")
+        lines = output.splitlines()
+        for filename, expected in (
+                ("single_object.mqo",
+                 "objects=1 materials=0 vertices=8 faces=6"),
+                ("multiple_objects.mqo",
+                 "objects=2 materials=0 vertices=50 faces=66"),
+                ("single_object.mqoz",
+                 "objects=1 materials=0 vertices=8 faces=6")):
+            matched = [line for line in lines
+                       if line.endswith("{}: {}".format(filename, expected))]
+            self.assertEqual(len(matched), 1, "Stats of {}".format(filename))
+        self.assertIn("files (0 errors)", lines[-1], "Summary")
+
+    def test_main_resave_output_dir(self):
+        in_dir = os.path.join(self.tmpdir, "in")
+        out_dir = os.path.join(self.tmpdir, "out")
+        # Files with the same name in different directories.
+        sources = {"a/model.mqo": "single_object.mqo",
+                   "b/model.mqo": "multiple_objects.mqo",
+                   "model.mqoz": "single_object.mqoz"}
+        for relpath, filename in sources.items():
+            os.makedirs(os.path.dirname(os.path.join(in_dir, relpath)),
+                        exist_ok=True)
+            shutil.copy(fixture_path(filename), os.path.join(in_dir, relpath))
+
+        ret, _ = run_main(["resave", "-j", "1", "-o", out_dir, in_dir])
+        self.assertEqual(ret, 0, "Exit status")
+        for relpath, filename in sources.items():
+            out_path = os.path.join(out_dir, relpath)
+            self.assertTrue(os.path.isfile(out_path),
+                            "{} is saved".format(relpath))
+            self.assertEqual(
+                objects_str(self._load_without_cache(out_path)),
+                objects_str(self._load_without_cache(fixture_path(filename))))
+
+        # Refuse to save different files to the same path.
+        with self.assertRaises(SystemExit):
+            run_main(["resave", "-o", out_dir,
+                      os.path.join(in_dir, "a/model.mqo"),
+                      os.path.join(in_dir, "b/model.mqo")])
+
+    def test_main_invalid_workers(self):
+        with self.assertRaises(SystemExit):
+            run_main(["stats", "-j", "0", fixture_path("simple.mqo")])
+
+    def test_lazy_load(self):
+        for filename in ("multiple_objects.mqo", "multiple_materials.mqo",
+                         "single_object_with_bvertex.mqo",
+                         "vertexattr.mqo", "empty_object.mqo"):
+            filepath = fixture_path(filename)
+            expected = self._load_without_cache(filepath)
+            mqo_file = MqoFile()
+            mqo_file.load(filepath, lazy=True)
+
+            self.assertEqual(
+                [m.to_str(fmt='MQO_FILE') for m in mqo_file.get_materials()],
+                [m.to_str(fmt='MQO_FILE') for m in expected.get_materials()])
+            objects = mqo_file.get_objects()
+            self.assertEqual(len(objects), len(expected.get_objects()),
+                             "Number of objects in {}".format(filename))
+            for obj, expected_obj in zip(objects, expected.get_objects()):
+                self.assertIsInstance(obj, mqo.LazyObject)
+                self.assertFalse(obj.is_loaded(), "Not loaded until access")
+
+                chunk = obj.get_chunk_info()
+                self.assertEqual(chunk.kind, "Object")
+                self.assertEqual(chunk.name, expected_obj.name)
+                self.assertEqual(chunk.depth, expected_obj.depth)
+                self.assertEqual(
+                    chunk.num_vertices,
+                    len(expected_obj.get_vertex_buffer()) // 3,
+                    "Number of vertices of {}".format(chunk.name))
+                self.assertEqual(
+                    chunk.num_faces, len(expected_obj.get_face_buffer()),
+                    "Number of faces of {}".format(chunk.name))
+
+                # Name and depth are available without loading the chunk.
+                self.assertEqual(obj.name, expected_obj.name)
+                self.assertFalse(obj.is_loaded(), "Not loaded by the name")
+
+                vertices = obj.get_vertex_buffer()
+                self.assertTrue(obj.is_loaded(), "Loaded on the first access")
+                self.assertEqual(list(vertices),
+                                 list(expected_obj.get_vertex_buffer()))
+            self.assertEqual(objects_str(mqo_file), objects_str(expected))
+
+    def test_lazy_load_explicitly(self):
+        filepath = fixture_path("multiple_objects.mqo")
+        mqo_file = MqoFile()
+        mqo_file.load(filepath, lazy=True)
+        obj = mqo_file.get_objects()[1]
+        obj.load()
+        self.assertTrue(obj.is_loaded())
+        self.assertFalse(mqo_file.get_objects()[0].is_loaded(),
+                         "Other objects are not loaded")
+        self.assertEqual(
+            obj.to_str(fmt='MQO_FILE'),
+            objects_str(self._load_without_cache(filepath))[1])
+
+    def test_parallel_load(self):
+        for filename in ("multiple_objects.mqo", "multiple_materials.mqo",
+                         "single_object_with_bvertex.mqo", "scene.mqo"):
+            filepath = fixture_path(filename)
+            expected = self._load_without_cache(filepath)
+            mqo_file = MqoFile()
+            mqo_file.load(filepath, max_workers=2)
+
+            self.assertEqual(
+                [o.name for o in mqo_file.get_objects()],
+                [o.name for o in expected.get_objects()],
+                "Order of objects in {}".format(filename))
+            self.assertEqual(objects_str(mqo_file), objects_str(expected))
+            self.assertEqual(
+                [m.to_str(fmt='MQO_FILE') for m in mqo_file.get_materials()],
+                [m.to_str(fmt='MQO_FILE') for m in expected.get_materials()])
+
+    def test_split_face_line(self):
+        expected = (3, [(b"V", b"0 1 2"), (b"M", b"0")])
+        for line in (b"3 V(0 1 2) M(0)", b"3\tV(0 1 2)\tM(0)",
+                     b"3  V(0 1 2)   M(0)", b"3 \t V(0 1 2) M(0)"):
+            self.assertEqual(mqo.split_face_line(line), expected,
+                             "Split {}".format(line))
+        self.assertEqual(mqo.split_face_line(b"2"), (2, []))
+        for line in (b"", b"V(0 1 2)", b"3 V(0 1 2"):
+            with self.assertRaises(RuntimeError):
+                mqo.split_face_line(line)
@@ -12,6 +12,7 @@ def test_main():
     test_cases = [
         blender_mqo_test.import_test.TestImportMqo,
         blender_mqo_test.export_test.TestExportMqo,
+        blender_mqo_test.mqo_file_test.TestMqoFile,
     ]
 
     suite = unittest.TestSuite()
@@ -0,0 +1,395 @@
+"""
+Benchmarks for utils/mqo_file.py.
+
+This script does not depend on Blender, and can be run by the plain python
+interpreter.
+
+    python tools/benchmark_mqo_file.py load --sizes 10 50 100 500 --workers 8
+    python tools/benchmark_mqo_file.py chunks --lines 1000000
+    python tools/benchmark_mqo_file.py memory --faces 1000000
+    python tools/benchmark_mqo_file.py dedup --faces 10000 100000 2000000
+    python tools/benchmark_mqo_file.py save --faces 100000 1000000 3000000
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src", "blender_mqo", "utils"))
+import mqo_file     # noqa # pylint: disable=C0413,E0401
+
+
+MB = 1024 * 1024
+
+
+def write_grid_object(f, name, grid_size):
+    f.write("Object \"{}\" {{\r\n".format(name).encode())
+    f.write(b"\tdepth 0\r\n\tfolding 0\r\n\tscale 1 1 1\r\n"
+            b"\trotation 0 0 0\r\n\ttranslation 0 0 0\r\n"
+            b"\tvisible 15\r\n\tlocking 0\r\n\tshading 1\r\n\tfacet 59.5\r\n"
+            b"\tcolor 0.898 0.498 0.698\r\n\tcolor_type 0\r\n")
+
+    f.write("\tvertex {} {{\r\n".format(grid_size * grid_size).encode())
+    lines = []
+    for y in range(grid_size):
+        for x in range(grid_size):
+            lines.append("\t\t{:.4f} {:.4f} {:.4f}\r\n"
+                         .format(x * 1.5, (x * y) % 7 * 0.25, y * -1.5))
+    f.write("".join(lines).encode())
+    f.write(b"\t}\r\n")
+
+    num_faces = (grid_size - 1) * (grid_size - 1)
+    f.write("\tface {} {{\r\n".format(num_faces).encode())
+    lines = []
+    inv = 1.0 / (grid_size - 1)
+    for y in range(grid_size - 1):
+        for x in range(grid_size - 1):
+            v0 = y * grid_size + x
+            lines.append(
+                "\t\t4 V({} {} {} {}) M(0) "
+                "UV({:.5f} {:.5f} {:.5f} {:.5f} {:.5f} {:.5f} {:.5f} {:.5f})"
+                "\r\n".format(v0, v0 + 1, v0 + grid_size + 1, v0 + grid_size,
+                              x * inv, y * inv, (x + 1) * inv, y * inv,
+                              (x + 1) * inv, (y + 1) * inv,
+                              x * inv, (y + 1) * inv))
+    f.write("".join(lines).encode())
+    f.write(b"\t}\r\n}\r\n")
+
+
+def generate_mqo_file(filepath, size_mb, grid_size=100):
+    """Generate a .mqo file which has at least size_mb megabytes."""
+
+    with open(filepath, "wb") as f:
+        f.write(b"Metasequoia Document\r\nFormat Text Ver 1.1\r\n\r\n")
+        f.write(b"Scene {\r\n\tpos 0.0000 0.0000 1500.0000\r\n"
+                b"\tlookat 0.0000 0.0000 0.0000\r\n\thead -0.5236\r\n"
+                b"\tpich 0.5236\r\n}\r\n")
+        f.write(b"Material 1 {\r\n\t\"mat1\" shader(3) "
+                b"col(1.000 1.000 1.000 1.000) dif(0.800) amb(0.600) "
+                b"emi(0.000) spc(0.000) power(5.00)\r\n}\r\n")
+        index = 0
+        while f.tell() < size_mb * MB:
+            write_grid_object(f, "obj{}".format(index), grid_size)
+            index += 1
+        f.write(b"Eof\r\n")
+
+
+def generate_face_file(filepath, num_faces):
+    """Generate a .mqo file which has one object with about num_faces
+    faces."""
+
+    with open(filepath, "wb") as f:
+        f.write(b"Metasequoia Document\r\nFormat Text Ver 1.1\r\n\r\n")
+        write_grid_object(f, "obj0", int(math.sqrt(num_faces)) + 1)
+        f.write(b"Eof\r\n")
+
+
+def measure(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def load_file(filepath, lazy=False, max_workers=None):
+    mqo = mqo_file.MqoFile()
+    mqo.load(filepath, lazy=lazy, max_workers=max_workers)
+    return mqo
+
+
+def bench_load(args):
+    print("{:>10} {:>12} {:>12} {:>12} {:>12} {:>12}"
+          .format("size(MB)", "objects", "time(s)", "MB/s", "lazy(s)",
+                  "parallel(s)"))
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, "bench.mqo")
+            generate_mqo_file(filepath, size)
+            actual_mb = os.path.getsize(filepath) / MB
+            elapsed, mqo = measure(load_file, filepath)
+            lazy, _ = measure(load_file, filepath, lazy=True)
+            parallel, _ = measure(load_file, filepath,
+                                  max_workers=args.workers)
+            print("{:>10.1f} {:>12} {:>12.3f} {:>12.2f} {:>12.3f} {:>12.3f}"
+                  .format(actual_mb, len(mqo.get_objects()), elapsed,
+                          actual_mb / elapsed, lazy, parallel))
+
+
+# chunk type: (header line, body line, parser, patterns used per body line)
+CHUNK_SAMPLES = {
+    "vertex": (
+        b"vertex %d {",
+        b"\t\t12.3456 -7.8901 0.2500\r\n",
+        "_parse_vertex",
+        [],
+    ),
+    "face": (
+        b"face %d {",
+        b"\t\t4 V(120 121 222 221) M(0) UV(0.12121 0.24242 0.13131 "
+        b"0.24242 0.13131 0.25253 0.12121 0.25253)\r\n",
+        "_parse_face",
+        [],
+    ),
+    "material": (
+        b"Material %d {",
+        b"\t\"mat1\" shader(3) col(1.000 1.000 1.000 1.000) dif(0.800) "
+        b"amb(0.600) emi(0.000) spc(0.000) power(5.00) tex(\"a.png\")\r\n",
+        "_parse_material",
+        list(mqo_file.MATERIAL_FIELD_RGX.values()),
+    ),
+    "weit": (
+        b"weit {",
+        b"\t\t\t12 0.500\r\n",
+        "_parse_vertexattr_weit",
+        [mqo_file.WEIT_RGX],
+    ),
+}
+
+
+def parse_chunk(header, body, parser):
+    mqo = mqo_file.MqoFile()
+    # pylint: disable=protected-access
+    mqo._raw = mqo_file.RawData(body)
+    return getattr(mqo, parser)(header)
+
+
+def measure_pattern_lookup(patterns, num_lines):
+    """Measure the cost of looking up the patterns from the re module's
+    cache, which the parsers paid for every line before the patterns were
+    compiled at import time."""
+
+    sources = [p.pattern for p in patterns]
+    start = time.perf_counter()
+    for _ in range(num_lines):
+        for src in sources:
+            re.compile(src)
+    return time.perf_counter() - start
+
+
+def bench_chunks(args):
+    print("{:>10} {:>10} {:>16} {:>16}"
+          .format("chunk", "lines", "parse(us/line)", "lookup(us/line)"))
+    for name in args.types:
+        header_fmt, line, parser, patterns = CHUNK_SAMPLES[name]
+        header = header_fmt % args.lines if b"%d" in header_fmt \
+            else header_fmt
+        body = line * args.lines + b"\t}\r\n"
+        elapsed, _ = measure(parse_chunk, header, body, parser)
+        lookup = measure_pattern_lookup(patterns, args.lines)
+        print("{:>10} {:>10} {:>16.3f} {:>16.3f}"
+              .format(name, args.lines, elapsed / args.lines * 1e6,
+                      lookup / args.lines * 1e6))
+
+
+class DictFace:
+    """Dict-backed face which has the same attributes as mqo_file.Face
+    before it was given __slots__."""
+
+    def __init__(self):
+        for key in mqo_file.Face.__slots__:
+            setattr(self, key, None)
+
+
+def copy_faces(faces, cls):
+    copied = []
+    for face in faces:
+        c = cls()
+        # pylint: disable=protected-access
+        c._ngons = face.ngons
+        c._vertex_indices = face.vertex_indices
+        c._material = face.material
+        c._uv_coords = face.uv_coords
+        c._normals = face.normals
+        c._colors = face.colors
+        c._crs = face.crs
+        copied.append(c)
+    return copied
+
+
+def measure_memory(fn, *args):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = fn(*args)
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used, result
+
+
+def bench_memory(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "bench.mqo")
+        generate_face_file(filepath, args.faces)
+        used, mqo = measure_memory(load_file, filepath)
+    faces = mqo.get_objects()[0].get_faces()
+    num_faces = len(faces)
+
+    print("{:>24} {:>12}".format("storage", "bytes/face"))
+    print("{:>24} {:>12.1f}".format("loaded (FaceBuffer)", used / num_faces))
+    for name, cls in (("Face (__dict__)", DictFace),
+                      ("Face (__slots__)", mqo_file.Face)):
+        used, _ = measure_memory(copy_faces, faces, cls)
+        print("{:>24} {:>12.1f}".format(name, used / num_faces))
+
+
+def build_grid_object(num_faces, duplicate_ratio=0.1):
+    """Build an object which has num_faces quads. Some of them share the
+    vertices with the preceding quad in the reversed order."""
+
+    grid_size = int(math.sqrt(num_faces)) + 1
+    buffer = mqo_file.FaceBuffer()
+    num_duplicates = int(num_faces * duplicate_ratio)
+    step = num_faces // num_duplicates if num_duplicates > 0 else 0
+    prev = []
+    for i in range(num_faces):
+        if prev and step > 0 and i % step == step - 1:
+            indices = prev[::-1]
+        else:
+            x, y = i % (grid_size - 1), i // (grid_size - 1)
+            v0 = y * grid_size + x
+            indices = [v0, v0 + 1, v0 + grid_size + 1, v0 + grid_size]
+        buffer.append(4, vertex_indices=indices)
+        prev = indices
+    obj = mqo_file.Object()
+    obj.add_faces(buffer)
+    return obj
+
+
+def uniq_faces_quadratic(obj):
+    """Face de-duplication which Object.get_faces(uniq=True) did before
+    the hashed index was introduced."""
+
+    faces = []
+    for f1 in obj.get_faces():
+        f1_vertex_indices = set(f1.vertex_indices)
+        for f2 in faces:
+            if f1_vertex_indices == set(f2.vertex_indices):
+                break
+        else:
+            faces.append(f1)
+    return faces
+
+
+def bench_dedup(args):
+    print("{:>10} {:>10} {:>14} {:>14} {:>14}"
+          .format("faces", "uniq", "hashed(s)", "cached(s)", "quadratic(s)"))
+    for num_faces in args.faces:
+        obj = build_grid_object(num_faces)
+        elapsed, faces = measure(obj.get_faces, uniq=True)
+        cached, _ = measure(obj.get_faces, uniq=True)
+        if num_faces <= args.quadratic_limit:
+            quadratic = "{:>14.3f}".format(
+                measure(uniq_faces_quadratic, obj)[0])
+        else:
+            quadratic = "{:>14}".format("-")
+        print("{:>10} {:>10} {:>14.3f} {:>14.3f} {}"
+              .format(num_faces, len(faces), elapsed, cached, quadratic))
+
+
+def measure_peak_memory(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def build_save_target(num_faces):
+    obj = build_grid_object(num_faces, duplicate_ratio=0.0)
+    grid_size = int(math.sqrt(num_faces)) + 1
+    for y in range(grid_size):
+        for x in range(grid_size):
+            obj.add_vertex([x * 1.5, (x * y) % 7 * 0.25, y * -1.5])
+    mqo = mqo_file.MqoFile()
+    mqo.version = "1.1"
+    mqo.format = "Text"
+    mqo.add_object(obj)
+    return mqo
+
+
+def bench_save(args):
+    print("{:>10} {:>12} {:>14} {:>14}"
+          .format("faces", "time(s)", "us/face", "peak(MB)"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "bench.mqo")
+        for num_faces in args.faces:
+            mqo = build_save_target(num_faces)
+            save_args = (filepath, None, args.binary_vertex)
+            if args.no_trace:
+                elapsed, _ = measure(mqo.save, *save_args)
+                peak = float("nan")
+            else:
+                elapsed, peak = measure_peak_memory(mqo.save, *save_args)
+            print("{:>10} {:>12.3f} {:>14.3f} {:>14.1f}"
+                  .format(num_faces, elapsed, elapsed / num_faces * 1e6,
+                          peak / MB))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mqo_file.py")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    load_parser = subparsers.add_parser(
+        "load", help="Measure MqoFile.load time against the file size")
+    load_parser.add_argument("--sizes", type=int, nargs="+",
+                             default=[10, 50, 100, 200, 500],
+                             help="File sizes to measure (MB)")
+    load_parser.add_argument("--workers", type=int,
+                             default=os.cpu_count() or 1,
+                             help="Number of processes of the parallel load")
+    load_parser.set_defaults(func=bench_load)
+
+    chunks_parser = subparsers.add_parser(
+        "chunks", help="Measure per-line parse time of each chunk type")
+    chunks_parser.add_argument("--lines", type=int, default=1000000,
+                               help="Number of lines in a chunk")
+    chunks_parser.add_argument("--types", nargs="+",
+                               choices=list(CHUNK_SAMPLES.keys()),
+                               default=list(CHUNK_SAMPLES.keys()),
+                               help="Chunk types to measure")
+    chunks_parser.set_defaults(func=bench_chunks)
+
+    memory_parser = subparsers.add_parser(
+        "memory", help="Measure memory usage per face")
+    memory_parser.add_argument("--faces", type=int, default=1000000,
+                               help="Number of faces in a file")
+    memory_parser.set_defaults(func=bench_memory)
+
+    dedup_parser = subparsers.add_parser(
+        "dedup", help="Measure Object.get_faces(uniq=True) time")
+    dedup_parser.add_argument("--faces", type=int, nargs="+",
+                              default=[10000, 100000, 500000, 1000000,
+                                       2000000],
+                              help="Number of faces to measure")
+    dedup_parser.add_argument("--quadratic-limit", type=int, default=10000,
+                              help="Also measure the quadratic "
+                                   "de-duplication up to this number of "
+                                   "faces")
+    dedup_parser.set_defaults(func=bench_dedup)
+
+    save_parser = subparsers.add_parser(
+        "save", help="Measure MqoFile.save time and peak memory")
+    save_parser.add_argument("--faces", type=int, nargs="+",
+                             default=[100000, 1000000, 3000000],
+                             help="Number of faces to save")
+    save_parser.add_argument("--no-trace", action="store_true",
+                             help="Do not trace the memory allocation, "
+                                  "which slows down saving")
+    save_parser.add_argument("--binary-vertex", action="store_true",
+                             help="Save vertices as BVertex chunk")
+    save_parser.set_defaults(func=bench_save)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()